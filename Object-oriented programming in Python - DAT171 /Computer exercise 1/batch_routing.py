@@ -0,0 +1,169 @@
+# Computer exercise 1 - many shortest path queries at once
+
+import functools
+import itertools
+import math
+import multiprocessing
+import os
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from shared_graph import SharedGraph
+
+# The graph of a worker process, it is sent once when the worker starts and not with every task. Searches in this
+# process get their graph as an argument, so two generators that are consumed interleaved do not share one
+_worker_graph = None
+_worker_directed = False
+_worker_shared = None
+
+
+def find_shortest_paths(graph, queries, directed=False, processes=None, group_size=32, components=None):
+    """
+    :param graph: The csr matrix from construct_graph, or a SharedGraph that the worker processes attach to instead of
+                  getting their own copy of the graph
+    :param queries: a sequence of (start_node, end_node) pairs
+    :param directed: if False the connections in graph can be used in both directions, like in find_shortest_path
+    :param processes: the number of worker processes, None for one per core and 0 to search in this process
+    :param group_size: the number of start cities that are searched with one dijkstra call
+    :param components: an optional ComponentIndex of an undirected graph, queries between two components are answered
+                       without any search
+    :return: a generator with the (path, distance) of every query in input order, an empty path and inf if the end
+             can not be reached
+    """
+    reachable = None if components is None else components.reachable_queries(queries)
+    groups = group_queries(queries, group_size, reachable)
+    unreachable = []
+    if reachable is not None:
+        unreachable.append([(position, [], math.inf) for position in np.flatnonzero(~reachable).tolist()])
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(groups))
+
+    if processes <= 1:
+        route = functools.partial(_route_group, graph.graph() if isinstance(graph, SharedGraph) else graph, directed)
+        yield from _in_input_order(itertools.chain(unreachable, map(route, groups)))
+        return
+
+    if isinstance(graph, SharedGraph):
+        initializer, initargs = _attach_worker, (graph.handle, directed)
+    else:
+        initializer, initargs = _init_worker, (graph.data, graph.indices, graph.indptr, graph.shape, directed)
+    with multiprocessing.Pool(processes, initializer=initializer, initargs=initargs) as pool:
+        yield from _in_input_order(itertools.chain(unreachable, pool.imap_unordered(_route_worker_group, groups)))
+
+
+def distance_table(graph, sources, targets, directed=False, chunk_size=64):
+    """
+    :param graph: The csr matrix from construct_graph
+    :param sources: the start cities, the rows of the table
+    :param targets: the end cities, the columns of the table
+    :param directed: if False the connections in graph can be used in both directions, like in find_shortest_path
+    :param chunk_size: the number of sources that are searched with one dijkstra call, every call returns chunk_size
+                       full rows of N float64 distances
+    :return: a float32 array with the shortest distance from every source to every target, inf if it can not be reached
+    """
+    # Besides the table the memory grows with chunk_size x N, not with S x N. ContractionHierarchy.distance_table
+    # keeps only the upward search spaces instead of full rows
+    targets = np.asarray(targets)
+    table = np.empty((len(sources), len(targets)), dtype=np.float32)
+    for first in range(0, len(sources), chunk_size):
+        chunk = np.asarray(sources[first:first + chunk_size])
+        table[first:first + len(chunk)] = dijkstra(graph, directed=directed, indices=chunk)[:, targets]
+    return table
+
+
+def group_queries(queries, group_size, reachable=None):
+    """
+    :param queries: a sequence of (start_node, end_node) pairs
+    :param group_size: the number of different start cities in a group
+    :param reachable: an optional boolean array, the queries where it is False are left out
+    :return: a list of (start_nodes, [(position, row, end_node), ...]) groups, where row is the index of the start city
+             in start_nodes, sorted by the first query in every group
+    """
+    sources = {}
+    for position, (start_node, end_node) in enumerate(queries):
+        if reachable is not None and not reachable[position]:
+            continue
+        sources.setdefault(int(start_node), []).append((position, int(end_node)))
+
+    # Start cities are taken in the order they first appear, so the first groups answer the first queries
+    sources = list(sources.items())
+    groups = []
+    for first in range(0, len(sources), group_size):
+        start_nodes = []
+        targets = []
+        for row, (start_node, ends) in enumerate(sources[first:first + group_size]):
+            start_nodes.append(start_node)
+            targets.extend((position, row, end_node) for position, end_node in ends)
+        groups.append((start_nodes, targets))
+    return groups
+
+
+def _init_worker(data, indices, indptr, shape, directed):
+    """
+    :param data: the csr data of the graph
+    :param indices: the csr column indices of the graph
+    :param indptr: the csr row pointers of the graph
+    :param shape: the shape of the graph
+    :param directed: if False the connections can be used in both directions
+    """
+    global _worker_graph, _worker_directed
+    _worker_graph = csr_matrix((data, indices, indptr), shape=shape)
+    _worker_directed = directed
+
+
+def _attach_worker(handle, directed):
+    """
+    :param handle: the handle of a published SharedGraph
+    :param directed: if False the connections can be used in both directions
+    """
+    global _worker_graph, _worker_directed, _worker_shared
+    _worker_shared = SharedGraph.attach(handle)  # kept so the blocks stay mapped as long as the worker lives
+    _worker_graph = _worker_shared.graph()
+    _worker_directed = directed
+
+
+def _route_worker_group(group):
+    """
+    :param group: a (start_nodes, targets) group from group_queries
+    :return: a list with the (position, path, distance) of every query in the group, searched on the worker graph
+    """
+    return _route_group(_worker_graph, _worker_directed, group)
+
+
+def _route_group(graph, directed, group):
+    """
+    :param graph: the csr matrix that is searched
+    :param directed: if False the connections can be used in both directions
+    :param group: a (start_nodes, targets) group from group_queries
+    :return: a list with the (position, path, distance) of every query in the group
+    """
+    start_nodes, targets = group
+    dist_matrix, predecessors = dijkstra(graph, directed=directed, indices=start_nodes, return_predecessors=True)
+    results = []
+    for position, row, end_node in targets:
+        distance = float(dist_matrix[row, end_node])
+        if math.isinf(distance):
+            results.append((position, [], math.inf))
+            continue
+        tree = predecessors[row]
+        shortest = [end_node]
+        while tree.item(shortest[-1]) != -9999:
+            shortest.append(tree.item(shortest[-1]))
+        results.append((position, shortest[-1::-1], distance))
+    return results
+
+
+def _in_input_order(results):
+    """
+    :param results: an iterable with lists of (position, path, distance) in any order
+    :return: a generator with the (path, distance) of every position, each one as soon as all earlier ones are known
+    """
+    waiting = {}
+    next_position = 0
+    for group in results:
+        for position, path, distance in group:
+            waiting[position] = (path, distance)
+        while next_position in waiting:
+            yield waiting.pop(next_position)
+            next_position += 1
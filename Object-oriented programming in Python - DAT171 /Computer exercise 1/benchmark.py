@@ -0,0 +1,254 @@
+# Computer exercise 1 - benchmark of the pipeline stages on synthetic coordinate files
+
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import sys
+import time
+import numpy as np
+import scipy
+from contraction import ContractionHierarchy
+from shortest_path import (construct_fast_graph_connections, construct_graph, construction_graph_connections,
+                           find_astar_path, find_shortest_path, make_undirected, mercator_projection,
+                           read_coordinate_file)
+
+# The synthetic cities lie in a box of about the size of Germany, as latitude and longitude
+LATITUDES = (47., 55.)
+LONGITUDES = (6., 15.)
+DISTRIBUTIONS = ('uniform', 'clustered', 'road')
+
+
+def uniform_cities(N, rng):
+    """
+    :param N: the number of cities
+    :param rng: a numpy Generator
+    :return: an (N, 2) array with the latitude and longitude of cities spread evenly over the box
+    """
+    return np.column_stack((rng.uniform(*LATITUDES, N), rng.uniform(*LONGITUDES, N)))
+
+
+def clustered_cities(N, rng, cluster_size=500):
+    """
+    :param N: the number of cities
+    :param rng: a numpy Generator
+    :param cluster_size: the average number of cities in a cluster
+    :return: an (N, 2) array with cities in clusters of very different sizes and spreads, like towns around cities
+    """
+    clusters = max(1, N // cluster_size)
+    centres = uniform_cities(clusters, rng)
+    weights = rng.pareto(1.5, clusters) + 1
+    cluster = rng.choice(clusters, size=N, p=weights / weights.sum())
+    spread = rng.uniform(0.02, 0.3, clusters)[cluster, None]
+    lat_lon = centres[cluster] + rng.normal(size=(N, 2)) * spread
+    return np.column_stack((np.clip(lat_lon[:, 0], *LATITUDES), np.clip(lat_lon[:, 1], *LONGITUDES)))
+
+
+def road_cities(N, rng, road_length=200):
+    """
+    :param N: the number of cities
+    :param rng: a numpy Generator
+    :param road_length: the number of cities along one road
+    :return: an (N, 2) array with cities along winding roads, close to each other along a road and far apart
+             between the roads
+    """
+    roads = math.ceil(N / road_length)
+    heading = rng.uniform(0, 2 * np.pi, (roads, 1)) + np.cumsum(rng.normal(0, 0.15, (roads, road_length)), axis=1)
+    step = rng.uniform(0.005, 0.02, (roads, 1))
+    lat = rng.uniform(*LATITUDES, (roads, 1)) + np.cumsum(step * np.sin(heading), axis=1)
+    lon = rng.uniform(*LONGITUDES, (roads, 1)) + np.cumsum(step * np.cos(heading), axis=1)
+    lat_lon = np.column_stack((lat.ravel(), lon.ravel()))[:N] + rng.normal(0, 0.001, (N, 2))
+    return np.column_stack((np.clip(lat_lon[:, 0], *LATITUDES), np.clip(lat_lon[:, 1], *LONGITUDES)))
+
+
+def write_coordinate_file(filename, lat_lon):
+    """
+    :param filename: the file that is written in the {lat, lon} format of the files in Data
+    :param lat_lon: an array with the latitude and longitude of every city
+    """
+    with open(filename, 'w') as file:
+        for block in range(0, len(lat_lon), 1 << 16):
+            file.writelines('{%.6f, %.6f}\n' % (lat, lon) for lat, lon in lat_lon[block:block + (1 << 16)].tolist())
+
+
+def coordinate_file(directory, distribution, N, seed=0):
+    """
+    :param directory: the directory the generated files are kept in
+    :param distribution: 'uniform', 'clustered' or 'road'
+    :param N: the number of cities
+    :param seed: the seed of the generator
+    :return: the path of the file, it is only generated when it does not exist yet
+    """
+    filename = os.path.join(directory, '%s-%d-%d.txt' % (distribution, N, seed))
+    if not os.path.exists(filename):
+        os.makedirs(directory, exist_ok=True)
+        generate = {'uniform': uniform_cities, 'clustered': clustered_cities, 'road': road_cities}[distribution]
+        write_coordinate_file(filename + '.tmp', generate(N, np.random.default_rng(seed)))
+        os.replace(filename + '.tmp', filename)
+    return filename
+
+
+def benchmark_radius(N, neighbours=8):
+    """
+    :param N: the number of cities
+    :param neighbours: the average number of neighbours if the cities were spread evenly over the box
+    :return: the radius that gives about that many neighbours
+    """
+    corners = mercator_projection(np.array([[LATITUDES[0], LONGITUDES[0]], [LATITUDES[1], LONGITUDES[1]]]))
+    area = np.prod(np.abs(corners[1] - corners[0]))
+    return math.sqrt(neighbours * area / (math.pi * N))
+
+
+def run_case(filename, neighbours=8, repeat=1, slow_limit=5000, check_limit=100000, contraction_limit=100000):
+    """
+    :param filename: a coordinate file
+    :param neighbours: the average number of neighbours that decides the radius
+    :param repeat: every stage is run this many times and the fastest run is kept
+    :param slow_limit: construction_graph_connections is only run up to this many cities
+    :param check_limit: find_astar_path is only timed and compared with find_shortest_path up to this many cities
+    :param contraction_limit: ContractionHierarchy.from_graph is only timed up to this many cities
+    :return: a dictionary with the seconds of every stage, the sizes and the result of every check
+    """
+    def timed(function, *args, **kwargs):
+        best = math.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            best = min(best, time.perf_counter() - start)
+        return result, best
+
+    seconds = {}
+    checks = {}
+    coord_list, seconds['parse'] = timed(read_coordinate_file, filename)
+    N = len(coord_list)
+    radius = benchmark_radius(N, neighbours)
+
+    (connections, distances), seconds['construct_fast_graph_connections'] = timed(
+        construct_fast_graph_connections, coord_list, radius)
+    (grid_connections, grid_distances), seconds['construct_fast_graph_connections_grid'] = timed(
+        construct_fast_graph_connections, coord_list, radius, method='grid')
+    checks['grid_equals_kdtree'] = bool(np.array_equal(grid_connections, connections) and
+                                        np.array_equal(grid_distances, distances))
+    del grid_connections, grid_distances
+    if N <= slow_limit:
+        (slow_connections, slow_distances), seconds['construction_graph_connections'] = timed(
+            construction_graph_connections, coord_list, radius)
+        # The loop squares Python floats and the fast builder numpy arrays, the lengths may differ in the last bit
+        checks['slow_equals_fast'] = bool(np.array_equal(slow_connections, connections) and
+                                          np.allclose(slow_distances, distances, rtol=1e-12, atol=0))
+
+    graph, seconds['construct_graph'] = timed(construct_graph, connections, distances, N)
+    start_node, end_node = 0, N // 2
+    (path, dist_matrix), seconds['find_shortest_path'] = timed(find_shortest_path, graph, start_node, end_node)
+    distance = float(dist_matrix[end_node])
+    undirected = make_undirected(graph)
+    checks['undirected_search_agrees'] = bool(
+        find_shortest_path(undirected, start_node, end_node, directed=True)[1][end_node] == distance)
+    if N <= check_limit:
+        (astar_path, astar_distance), seconds['find_astar_path'] = timed(
+            find_astar_path, undirected, coord_list, start_node, end_node, directed=True)
+        checks['astar_agrees'] = bool(math.isclose(astar_distance, distance, rel_tol=1e-9) or
+                                      (math.isinf(distance) and math.isinf(astar_distance)))
+    if N <= contraction_limit:
+        # The contraction is the slow part of the hierarchy, the stage shows when it gets slower
+        hierarchy, seconds['contraction'] = timed(ContractionHierarchy.from_graph, graph)
+        hierarchy_distance = hierarchy.find_shortest_path(start_node, end_node)[1]
+        checks['contraction_agrees'] = bool(math.isclose(hierarchy_distance, distance, rel_tol=1e-9) or
+                                            (math.isinf(distance) and math.isinf(hierarchy_distance)))
+
+    return {'cities': N, 'radius': radius, 'connections': len(connections), 'path_length': len(path),
+            'distance': None if math.isinf(distance) else distance, 'seconds': seconds, 'checks': checks}
+
+
+def run_suite(sizes=(1000, 10000, 100000, 1000000), distributions=DISTRIBUTIONS, directory='.benchmark_data',
+              neighbours=8, repeat=1, slow_limit=5000, seed=0, log=None):
+    """
+    :param sizes: the numbers of cities
+    :param distributions: the generators that are used
+    :param directory: the directory the generated coordinate files are kept in
+    :param neighbours: the average number of neighbours that decides the radius
+    :param repeat: every stage is run this many times and the fastest run is kept
+    :param slow_limit: construction_graph_connections is only run up to this many cities
+    :param seed: the seed of the generators
+    :param log: an optional file that gets one line for every finished case
+    :return: the results, with the versions and the machine they were measured on
+    """
+    cases = []
+    for N in sizes:
+        for distribution in distributions:
+            filename = coordinate_file(directory, distribution, N, seed)
+            case = dict(run_case(filename, neighbours, repeat, slow_limit), distribution=distribution, size=N)
+            cases.append(case)
+            if log is not None:
+                stages = ' '.join('%s=%.4f' % item for item in case['seconds'].items())
+                failed = '' if all(case['checks'].values()) else ' CHECK FAILED'
+                print('%-10s %9d %s%s' % (distribution, N, stages, failed), file=log)
+    return {'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'numpy': np.__version__, 'scipy': scipy.__version__,
+            'machine': platform.platform(), 'cpus': os.cpu_count(), 'cases': cases}
+
+
+def compare(results, baseline, tolerance=0.25, minimum=0.005):
+    """
+    :param results: the results from run_suite
+    :param baseline: earlier results from run_suite
+    :param tolerance: a stage is a regression when it is this fraction slower than in the baseline
+    :param minimum: differences below this many seconds are never regressions, short stages are noisy
+    :return: a list with a dictionary for every regression and every failed check
+    """
+    before = {(case['distribution'], case['size']): case for case in baseline['cases']}
+    problems = []
+    for case in results['cases']:
+        for check, passed in case['checks'].items():
+            if not passed:
+                problems.append({'distribution': case['distribution'], 'size': case['size'], 'check': check})
+        old = before.get((case['distribution'], case['size']))
+        if old is None:
+            continue
+        for stage, seconds in case['seconds'].items():
+            old_seconds = old['seconds'].get(stage)
+            if old_seconds is not None and seconds > old_seconds * (1 + tolerance) and seconds - old_seconds > minimum:
+                problems.append({'distribution': case['distribution'], 'size': case['size'], 'stage': stage,
+                                 'seconds': seconds, 'baseline': old_seconds, 'ratio': seconds / old_seconds})
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the shortest path pipeline on synthetic cities.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000],
+                        help='the numbers of cities, up to 10000000')
+    parser.add_argument('--distributions', nargs='+', choices=DISTRIBUTIONS, default=list(DISTRIBUTIONS))
+    parser.add_argument('--data', default='.benchmark_data', help='the directory of the generated coordinate files')
+    parser.add_argument('--neighbours', type=float, default=8, help='the average number of neighbours')
+    parser.add_argument('--repeat', type=int, default=1, help='the fastest of this many runs is kept')
+    parser.add_argument('--slow-limit', type=int, default=5000, help='the largest size for the O(N^2) builder')
+    parser.add_argument('--output', default='benchmark_results.json', help='the results file')
+    parser.add_argument('--baseline', help='a results file to compare with, regressions give exit code 1')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='the allowed slowdown against the baseline')
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.sizes, args.distributions, args.data, args.neighbours, args.repeat, args.slow_limit,
+                        log=sys.stdout)
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=1)
+    print('Results written to %s' % args.output)
+
+    problems = []
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            problems = compare(results, json.load(file), args.tolerance)
+    else:
+        problems = compare(results, {'cases': []})
+    for problem in problems:
+        if 'check' in problem:
+            print('FAILED CHECK %(check)s for %(distribution)s %(size)d' % problem)
+        else:
+            print('REGRESSION %(stage)s for %(distribution)s %(size)d: %(seconds).4f s against %(baseline).4f s'
+                  % problem)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+# Computer exercise 1 - connected components for rejecting routes that can not exist
+
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+
+
+class ComponentIndex:
+    """ The connected components of the graph from construct_graph, the connections are used in both directions """
+
+    def __init__(self, labels):
+        """
+        :param labels: the component of every city
+        """
+        self.labels = labels
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        :param graph: The csr matrix from construct_graph
+        :return: the component index of the graph
+        """
+        _, labels = connected_components(graph, directed=False)
+        return cls(labels.astype(np.int32))
+
+    def reachable(self, start_node, end_node):
+        """
+        :param start_node: The first city
+        :param end_node: The last city
+        :return: True if there is a path between the two cities
+        """
+        return self.labels[start_node] == self.labels[end_node]
+
+    def reachable_queries(self, queries):
+        """
+        :param queries: a sequence of (start_node, end_node) pairs
+        :return: a boolean array that is True for the queries that have a path
+        """
+        queries = np.asarray(queries, dtype=np.int64).reshape(-1, 2)
+        return self.labels[queries[:, 0]] == self.labels[queries[:, 1]]
+
+    def report(self):
+        """
+        :return: a dictionary with the number of components, the size of every component, the largest component and
+                 its size and the number of cities without any connection
+        """
+        sizes = np.bincount(self.labels)
+        return {'components': len(sizes),
+                'sizes': sizes,
+                'largest': int(np.argmax(sizes)) if len(sizes) else -1,
+                'largest_size': int(sizes.max()) if len(sizes) else 0,
+                'isolated': int(np.count_nonzero(sizes == 1))}
@@ -0,0 +1,498 @@
+# Computer exercise 1 - contraction hierarchies for many queries on the same graph
+
+import heapq
+import math
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
+from shortest_path import make_undirected
+
+
+class ContractionHierarchy:
+    """ A contraction hierarchy over the graph from construct_graph, the connections are used in both directions.
+    The cities with the highest ranks form a core that is not contracted, the queries cross it with a table of the
+    distances between all core cities, or with a dijkstra search in the core when it is too large for a table """
+
+    def __init__(self, rank, indptr, indices, data, middle, first_core, core_distances=None, core_predecessors=None):
+        """
+        :param rank: the contraction order of every city, cities with a higher rank were contracted later
+        :param indptr: the csr row pointers of the upward graph, where every connection goes to a higher rank
+        :param indices: the csr column indices of the upward graph, sorted within every row
+        :param data: the length of every upward connection
+        :param middle: the contracted city that every upward connection is a shortcut over, -1 for original roads
+        :param first_core: the lowest rank of the core cities, the core cities have all ranks from it on
+        :param core_distances: the shortest distance between every two core cities, indexed by rank - first_core,
+                               or None to search the core on every query
+        :param core_predecessors: the predecessor of every core city on the shortest path from every other one, also
+                                  indexed by rank - first_core, -9999 if there is none
+        """
+        self.rank = rank
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.middle = middle
+        self.first_core = first_core
+        self.core_distances = core_distances
+        self.core_predecessors = core_predecessors
+        N = len(rank)
+        self.upward = csr_matrix((data, indices, indptr), shape=(N, N))
+        self._edges = None
+
+    @classmethod
+    def from_graph(cls, graph, core_size=3000, max_shortcuts=256, witness_limit=20):
+        """
+        :param graph: The csr matrix from construct_graph
+        :param core_size: the contraction stops when this many cities are left. A core of at most core_size cities
+                          gets a table of 12 * core_size ** 2 bytes, a graph with at most core_size cities is not
+                          contracted at all
+        :param max_shortcuts: a city whose contraction would need more shortcuts stays in the core. Graphs without a
+                              road hierarchy, like evenly spread cities, otherwise end in a dense top that takes far
+                              longer to contract than the rest of the graph
+        :param witness_limit: the number of cities a witness search may settle, a larger limit finds more witnesses
+                              and so gives fewer shortcuts but takes longer
+        :return: the contraction hierarchy of the graph
+        """
+        graph = make_undirected(graph)
+        N = graph.shape[0]
+        row = np.repeat(np.arange(N), np.diff(graph.indptr))
+        road = graph.indices != row
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(row[road], minlength=N)))).tolist()
+        indices, data = graph.indices[road].tolist(), graph.data[road].tolist()
+        adjacency = [dict(zip(indices[indptr[u]:indptr[u + 1]], data[indptr[u]:indptr[u + 1]])) for u in range(N)]
+
+        shortcut_middle = {}
+        deleted_neighbours = [0] * N
+        level = [0] * N
+        upward = [None] * N
+        rank = np.empty(N, dtype=np.int32)
+        needed, priority = [0] * N, [0] * N
+        if N > core_size:
+            for v in range(N):
+                needed[v], priority[v] = _priority(adjacency, deleted_neighbours, level, v)
+
+        # Only the neighbours of a contracted city get a new priority, the older entries in the queue are skipped.
+        # Cities that stay in the core get no priority
+        queue = [(priority[v], v) for v in range(N)]
+        heapq.heapify(queue)
+        remaining = N
+        while remaining > core_size and queue:
+            entry, v = heapq.heappop(queue)
+            if adjacency[v] is None or entry != priority[v]:
+                continue
+            if needed[v] > max_shortcuts:
+                priority[v] = None
+                continue
+
+            shortcuts = _find_shortcuts(adjacency, v, witness_limit)
+            neighbours = adjacency[v]
+            upward[v] = sorted((u, w, shortcut_middle.get((min(u, v), max(u, v)), -1)) for u, w in neighbours.items())
+            for u in neighbours:
+                del adjacency[u][v]
+                deleted_neighbours[u] += 1
+                level[u] = max(level[u], level[v] + 1)
+            for u, w, length in shortcuts:
+                if length < adjacency[u].get(w, math.inf):
+                    adjacency[u][w] = length
+                    adjacency[w][u] = length
+                    shortcut_middle[(min(u, w), max(u, w))] = v
+            adjacency[v] = None
+            rank[v] = N - remaining
+            remaining -= 1
+            for u in neighbours:
+                if priority[u] is not None:
+                    needed[u], priority[u] = _priority(adjacency, deleted_neighbours, level, u)
+                    heapq.heappush(queue, (priority[u], u))
+
+        # The core keeps its roads and shortcuts, as upward connections to the core cities with a higher rank
+        first_core = N - remaining
+        core = [v for v in range(N) if adjacency[v] is not None]
+        rank[core] = np.arange(first_core, N)
+        for v in core:
+            upward[v] = sorted((u, w, shortcut_middle.get((min(u, v), max(u, v)), -1))
+                               for u, w in adjacency[v].items() if rank[u] > rank[v])
+
+        indptr = np.zeros(N + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(edges) for edges in upward])
+        edges = np.array([edge for edges in upward for edge in edges], dtype=np.float64).reshape(-1, 3)
+        hierarchy = cls(rank, indptr, edges[:, 0].astype(np.int32), edges[:, 1], edges[:, 2].astype(np.int32),
+                        first_core)
+        if 0 < remaining <= core_size:
+            distances, predecessors = dijkstra(hierarchy._core_graph(), directed=True, return_predecessors=True)
+            hierarchy.core_distances, hierarchy.core_predecessors = distances, predecessors.astype(np.int32)
+        return hierarchy
+
+    def save(self, filename):
+        """
+        :param filename: the .npz file the hierarchy is written to
+        """
+        arrays = dict(rank=self.rank, indptr=self.indptr, indices=self.indices, data=self.data, middle=self.middle,
+                      first_core=self.first_core)
+        if self.core_distances is not None:
+            arrays.update(core_distances=self.core_distances, core_predecessors=self.core_predecessors)
+        np.savez(filename, **arrays)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        :param filename: a .npz file written by save
+        :return: the contraction hierarchy in the file
+        """
+        with np.load(filename) as arrays:
+            return cls(arrays['rank'], arrays['indptr'], arrays['indices'], arrays['data'], arrays['middle'],
+                       int(arrays['first_core']), arrays.get('core_distances'), arrays.get('core_predecessors'))
+
+    def find_shortest_path(self, start_node, end_node):
+        """
+        :param start_node: The first city
+        :param end_node: The last city
+        :return: the shortest path as a list of cities and its total distance, an empty path and inf if end_node
+                 can not be reached
+        """
+        if self._edges is None:
+            self._prepare()
+        if self._labels[start_node] != self._labels[end_node]:
+            return [], math.inf
+
+        # Both searches only go upwards in the hierarchy and meet at the highest city of the shortest path. The side
+        # with the shorter queue minimum goes next, and the search stops once both minima are at least the best
+        # meeting so far. The searches do not go on from core cities, the paths over the core are joined afterwards
+        ranks, first_core = self._ranks, self.first_core
+        distances = ({start_node: 0.0}, {end_node: 0.0})
+        predecessors = ({start_node: -9999}, {end_node: -9999})
+        queues = ([(0.0, start_node)], [(0.0, end_node)])
+        entries = ({}, {})
+        best, hierarchy_path = math.inf, None
+        while True:
+            forward, backward = queues
+            if forward and forward[0][0] < best and not (backward and backward[0][0] < forward[0][0]):
+                side = 0
+            elif backward and backward[0][0] < best:
+                side = 1
+            else:
+                break
+            queue, distance = queues[side], distances[side]
+            dist_u, u = heapq.heappop(queue)
+            if dist_u > distance[u]:
+                continue
+            other = distances[1 - side].get(u)
+            if other is not None and dist_u + other < best:
+                best, hierarchy_path = dist_u + other, [u]
+            if ranks[u] >= first_core:
+                entries[side][u] = dist_u
+                continue
+
+            # Stall on demand, a higher city that reaches u with a shorter distance means u is not on a shortest
+            # upward path, so its connections are not relaxed
+            edges = self._edges[u]
+            for w, length in edges:
+                if distance.get(w, math.inf) + length < dist_u:
+                    break
+            else:
+                predecessor = predecessors[side]
+                for w, length in edges:
+                    dist_w = dist_u + length
+                    if dist_w < distance.get(w, math.inf):
+                        distance[w] = dist_w
+                        predecessor[w] = u
+                        heapq.heappush(queue, (dist_w, w))
+
+        if entries[0] and entries[1]:
+            core_distance, core_path = self._through_core(*entries, best)
+            if core_path:
+                best, hierarchy_path = core_distance, core_path
+        if hierarchy_path is None:
+            return [], math.inf
+
+        forward, backward = predecessors
+        while forward[hierarchy_path[0]] != -9999:
+            hierarchy_path.insert(0, forward[hierarchy_path[0]])
+        while backward[hierarchy_path[-1]] != -9999:
+            hierarchy_path.append(backward[hierarchy_path[-1]])
+
+        shortest = [start_node]
+        for u, v in zip(hierarchy_path[:-1], hierarchy_path[1:]):
+            shortest.extend(self._unpack(u, v))
+        return shortest, best
+
+    def distance_table(self, sources, targets):
+        """
+        :param sources: the start cities, the rows of the table
+        :param targets: the end cities, the columns of the table
+        :return: a float32 array with the shortest distance from every source to every target, inf if it can not be
+                 reached
+        """
+        if self._edges is None:
+            self._prepare()
+
+        # Bucket-based many-to-many: the upward search space of every target is stored in buckets at the cities it
+        # reaches, then the upward search of every source only has to scan the buckets of the cities it reaches. The
+        # core cities a target reaches are kept apart, they are joined with the distances over the core. Besides the
+        # table only the search spaces and one row of distances to the core cities are kept
+        target_rows, bucket_nodes, bucket_dist = self._upward_search_spaces(targets)
+        in_core = self.rank[bucket_nodes] >= self.first_core
+        core_targets = target_rows[in_core]
+        core_positions = self.rank[bucket_nodes[in_core]] - self.first_core
+        core_dist = bucket_dist[in_core]
+        order = np.argsort(bucket_nodes, kind='stable')
+        bucket_nodes, bucket_targets, bucket_dist = bucket_nodes[order], target_rows[order], bucket_dist[order]
+
+        table = np.full((len(sources), len(targets)), np.inf, dtype=np.float32)
+        source_rows, nodes, dist = self._upward_search_spaces(sources)
+        lo = np.searchsorted(bucket_nodes, nodes, side='left')
+        lengths = np.searchsorted(bucket_nodes, nodes, side='right') - lo
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(source_rows, minlength=len(sources)))))
+        for row in range(len(sources)):
+            first, last = bounds[row], bounds[row + 1]
+            count = lengths[first:last]
+            offsets = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+            entries = np.repeat(lo[first:last], count) + offsets
+            totals = np.full(len(targets), np.inf)
+            np.minimum.at(totals, bucket_targets[entries], np.repeat(dist[first:last], count) + bucket_dist[entries])
+
+            # Through the core: the distance from the source to every core city, then on to the targets
+            entry = self.rank[nodes[first:last]] >= self.first_core
+            if entry.any() and len(core_targets):
+                to_core = self._core_row(self.rank[nodes[first:last][entry]] - self.first_core, dist[first:last][entry])
+                np.minimum.at(totals, core_targets, to_core[core_positions] + core_dist)
+            table[row] = totals
+        return table
+
+    def _prepare(self):
+        """ Makes the Python lists that the queries use, on the first query """
+        indptr, indices, data = self.indptr.tolist(), self.indices.tolist(), self.data.tolist()
+        self._edges = [list(zip(indices[indptr[u]:indptr[u + 1]], data[indptr[u]:indptr[u + 1]]))
+                       for u in range(len(indptr) - 1)]
+        self._ranks = self.rank.tolist()
+        self._core = np.argsort(self.rank)[self.first_core:].tolist()
+        self._core_search = self._core_graph() if self.core_distances is None else None
+        # The shortcuts only join connected cities, so the upward graph has the components of the original graph
+        self._labels = connected_components(self.upward, directed=False)[1].tolist()
+        # The middle city of every shortcut, looked up from both ends
+        low = np.repeat(np.arange(len(self.rank)), np.diff(self.indptr))[self.middle >= 0].tolist()
+        high = self.indices[self.middle >= 0].tolist()
+        middle = self.middle[self.middle >= 0].tolist()
+        self._shortcuts = dict(zip(zip(low, high), middle))
+        self._shortcuts.update(zip(zip(high, low), middle))
+
+    def _core_graph(self):
+        """
+        :return: a csr matrix with the roads and shortcuts between the core cities in both directions, indexed by
+                 rank - first_core
+        """
+        size = len(self.rank) - self.first_core
+        row = np.repeat(np.arange(len(self.rank)), np.diff(self.indptr))
+        in_core = self.rank[row] >= self.first_core
+        low = self.rank[row[in_core]] - self.first_core
+        high = self.rank[self.indices[in_core]] - self.first_core
+        return csr_matrix((np.tile(self.data[in_core], 2), (np.concatenate((low, high)), np.concatenate((high, low)))),
+                          shape=(size, size))
+
+    def _search_core(self, positions, lengths, limit=np.inf):
+        """
+        :param positions: the core cities a search reached, as rank - first_core
+        :param lengths: the distance to every one of them
+        :param limit: the search does not go further than this distance
+        :return: the distance over the core to every core city and its predecessor, which is the number of core
+                 cities for the ones that are reached directly
+        """
+        # A virtual city joins the reached core cities, one dijkstra call from it gives the distances over the core
+        size = len(self._core)
+        core = self._core_search
+        graph = csr_matrix((np.concatenate((core.data, lengths)), np.concatenate((core.indices, positions)),
+                            np.append(core.indptr, core.nnz + len(positions))), shape=(size + 1, size + 1))
+        distances, predecessors = dijkstra(graph, directed=True, indices=size, return_predecessors=True, limit=limit)
+        return distances[:size], predecessors[:size]
+
+    def _core_row(self, positions, lengths):
+        """
+        :param positions: the core cities a search reached, as rank - first_core
+        :param lengths: the distance to every one of them
+        :return: the shortest distance over them to every core city
+        """
+        if self.core_distances is None:
+            return self._search_core(positions, lengths)[0]
+        return (self.core_distances[positions] + lengths[:, None]).min(axis=0)
+
+    def _through_core(self, forward, backward, best):
+        """
+        :param forward: a dictionary with the distance from the start city to every core city its search reached
+        :param backward: a dictionary with the distance from the end city to every core city its search reached
+        :param best: the length of the shortest path outside the core
+        :return: the length of a shorter path over the core and its core cities, or best and an empty list
+        """
+        first_core, ranks = self.first_core, self._ranks
+        forward_positions = np.array([ranks[u] - first_core for u in forward])
+        forward_dist = np.fromiter(forward.values(), dtype=np.float64, count=len(forward))
+        backward_positions = np.array([ranks[u] - first_core for u in backward])
+        backward_dist = np.fromiter(backward.values(), dtype=np.float64, count=len(backward))
+
+        if self.core_distances is not None:
+            totals = (self.core_distances[np.ix_(forward_positions, backward_positions)] + forward_dist[:, None]
+                      + backward_dist)
+            first, last = divmod(int(totals.argmin()), len(backward_positions))
+            distance = float(totals[first, last])
+            if distance >= best:
+                return best, []
+            start, predecessors = forward_positions[first], self.core_predecessors[forward_positions[first]]
+            path = [backward_positions[last]]
+            while path[-1] != start:
+                path.append(predecessors[path[-1]])
+        else:
+            to_core, predecessors = self._search_core(forward_positions, forward_dist, best)
+            totals = to_core[backward_positions] + backward_dist
+            last = int(totals.argmin())
+            distance = float(totals[last])
+            if distance >= best:
+                return best, []
+            path = [backward_positions[last]]
+            while predecessors[path[-1]] != len(self._core):
+                path.append(predecessors[path[-1]])
+        return distance, [self._core[i] for i in reversed(path)]
+
+    def _upward_search_spaces(self, nodes):
+        """
+        :param nodes: the cities the upward searches start from
+        :return: three arrays with the row of the start city, the reached city and its distance for every city that
+                 every search settles, sorted by row
+        """
+        rows, reached, distances = [], [], []
+        for row, node in enumerate(np.asarray(nodes).tolist()):
+            space = self._upward_search(node)
+            rows.extend([row] * len(space))
+            reached.extend(space)
+            distances.extend(space.values())
+        return np.array(rows, dtype=np.int64), np.array(reached, dtype=np.int64), np.array(distances)
+
+    def _upward_search(self, node):
+        """
+        :param node: the city the search starts from
+        :return: a dictionary with the distance to every city the upward search settles and does not stall, the
+                 search does not go on from core cities
+        """
+        ranks, first_core = self._ranks, self.first_core
+        distance = {node: 0.0}
+        settled = {}
+        queue = [(0.0, node)]
+        while queue:
+            dist_u, u = heapq.heappop(queue)
+            if dist_u > distance[u]:
+                continue
+            if ranks[u] >= first_core:
+                settled[u] = dist_u
+                continue
+            # A stalled city is not on a shortest upward path, so it can not be where a source and a target meet
+            edges = self._edges[u]
+            for w, length in edges:
+                if distance.get(w, math.inf) + length < dist_u:
+                    break
+            else:
+                settled[u] = dist_u
+                for w, length in edges:
+                    dist_w = dist_u + length
+                    if dist_w < distance.get(w, math.inf):
+                        distance[w] = dist_w
+                        heapq.heappush(queue, (dist_w, w))
+        return settled
+
+    def _unpack(self, u, v):
+        """
+        :param u: a city on the hierarchy path
+        :param v: the next city on the hierarchy path
+        :return: the cities of the original roads after u up to and including v
+        """
+        path = []
+        stack = [(u, v)]
+        while stack:
+            a, b = stack.pop()
+            middle = self._shortcuts.get((a, b), -1)
+            if middle < 0:
+                path.append(b)
+            else:
+                stack.append((middle, b))
+                stack.append((a, middle))
+        return path
+
+
+def _find_shortcuts(adjacency, v, witness_limit):
+    """
+    :param adjacency: the remaining graph as one {neighbour: length} dictionary per city
+    :param v: the city that is about to be contracted
+    :param witness_limit: the number of cities a witness search may settle
+    :return: a list of (u, w, length) shortcuts that are needed to keep the distances when v is removed
+    """
+    neighbours = list(adjacency[v].items())
+    shortcuts = []
+    for i, (u, dist_u) in enumerate(neighbours):
+        # A direct road or a path over one common neighbour that is not longer is a witness already, in radius graphs
+        # that is the case for most pairs. Only the others need a witness search
+        roads = adjacency[u]
+        targets = {}
+        for w, dist_w in neighbours[i + 1:]:
+            length = dist_u + dist_w
+            if roads.get(w, math.inf) <= length:
+                continue
+            other = adjacency[w]
+            for x in roads.keys() & other.keys():
+                if x != v and roads[x] + other[x] <= length:
+                    break
+            else:
+                targets[w] = length
+        if targets:
+            witness = _witness_search(adjacency, u, v, targets, witness_limit)
+            shortcuts.extend((u, w, length) for w, length in targets.items() if witness.get(w, math.inf) > length)
+    return shortcuts
+
+
+def _witness_search(adjacency, source, skip, targets, witness_limit):
+    """
+    :param adjacency: the remaining graph as one {neighbour: length} dictionary per city
+    :param source: the city the search starts from
+    :param skip: the city that may not be used
+    :param targets: a dictionary with the length of the shortcut to every city that needs a witness
+    :param witness_limit: the number of cities the search may settle
+    :return: a dictionary with the length of a path from source to every city the search reached, none of them go
+             through skip
+    """
+    # Dijkstra that stops once every target is settled, after witness_limit cities, or when the queue holds nothing
+    # shorter than the longest shortcut. Every reached distance is the length of a real path, a missed witness only
+    # costs an extra shortcut
+    longest = max(targets.values())
+    remaining = len(targets)
+    distance = {source: 0.0, skip: -1.0}  # skip is never reached with a shorter distance, so it is never used
+    queue = [(0.0, source)]
+    settled = 0
+    while queue:
+        dist_x, x = heapq.heappop(queue)
+        if dist_x > distance[x]:
+            continue
+        settled += 1
+        if x in targets:
+            remaining -= 1
+            if not remaining:
+                break
+        if settled >= witness_limit:
+            break
+        for y, length in adjacency[x].items():
+            dist_y = dist_x + length
+            if dist_y <= longest and dist_y < distance.get(y, math.inf):
+                distance[y] = dist_y
+                heapq.heappush(queue, (dist_y, y))
+    return distance
+
+
+def _priority(adjacency, deleted_neighbours, level, v):
+    """
+    :param adjacency: the remaining graph as one {neighbour: length} dictionary per city
+    :param deleted_neighbours: the number of contracted neighbours of every city
+    :param level: one more than the highest level of the contracted neighbours of every city, it keeps the hierarchy
+                  flat so the upward searches stay small
+    :param v: the city
+    :return: the number of shortcuts that contracting v needs at most, and its contraction priority, cities with a
+             lower priority are contracted first
+    """
+    # Every pair of neighbours without a connection between them may need a shortcut. Counting those pairs takes a
+    # set intersection per neighbour, a witness search per pair would cost more than the contraction itself
+    neighbours = adjacency[v].keys()
+    joined = sum(len(adjacency[u].keys() & neighbours) for u in neighbours) // 2
+    needed = len(neighbours) * (len(neighbours) - 1) // 2 - joined
+    return needed, 2 * (needed - len(neighbours)) + deleted_neighbours[v] + level[v]
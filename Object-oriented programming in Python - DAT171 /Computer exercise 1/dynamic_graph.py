@@ -0,0 +1,225 @@
+# Computer exercise 1 - a radius graph that is kept up to date when cities are added, removed or moved
+
+import math
+import numpy as np
+from scipy.sparse import csr_matrix
+from shortest_path import construct_fast_graph_connections, construct_graph, make_undirected
+
+
+class DynamicGraph:
+    """ The radius graph of a changing set of cities, only the connections near a changed city are computed again """
+
+    def __init__(self, coord_list, radius):
+        """
+        :param coord_list: a numpy array with the coordinates of the first cities
+        :param radius: the maximum radius between the cities
+        """
+        self.radius = radius
+        # Like grid_hash.grid_pairs any cell size from radius up finds every pair, radius 0 uses cells of size 1
+        self._cell_size = radius if radius > 0 else 1.
+        self.N = len(coord_list)
+        self._coordinates = np.array(coord_list, dtype=np.float64).reshape(-1, 2)
+        self._alive = np.ones(self.N, dtype=bool)
+
+        # A grid with cells of size _cell_size, the cells that can hold a neighbour of a city are the 3x3 around it
+        self._cells = {}
+        for city, cell in enumerate(map(tuple, np.floor(self._coordinates / self._cell_size).astype(np.int64).tolist())):
+            self._cells.setdefault(cell, set()).add(city)
+
+        # The connections are kept as a csr matrix with both directions, the rows that changed since the last export
+        # are dictionaries in _rows until the next export writes them back
+        connections, distances = construct_fast_graph_connections(self._coordinates, radius)
+        graph = make_undirected(construct_graph(connections, distances, self.N))
+        self._indptr = graph.indptr.astype(np.int64)
+        self._indices = graph.indices
+        self._data = graph.data
+        self._rows = {}
+        self._graph = None
+
+    def __len__(self):
+        return int(np.count_nonzero(self._alive[:self.N]))
+
+    @property
+    def coord_list(self):
+        """
+        :return: the coordinates of every city index, removed cities keep their last coordinates
+        """
+        return self._coordinates[:self.N]
+
+    def is_alive(self, city):
+        """
+        :param city: a city index
+        :return: True if the city was not removed
+        """
+        return 0 <= city < self.N and bool(self._alive[city])
+
+    def neighbours(self, city):
+        """
+        :param city: a city index
+        :return: a dictionary with the distance to every city within the radius
+        """
+        self._check(city)
+        return dict(self._row(city, changed=False))
+
+    def add_city(self, coordinates):
+        """
+        :param coordinates: the [x, y] coordinates of the new city
+        :return: the index of the new city, the indices of the other cities do not change
+        """
+        if self.N == len(self._coordinates):
+            capacity = max(2 * self.N, 16)
+            self._coordinates = np.resize(self._coordinates, (capacity, 2))
+            self._alive = np.resize(self._alive, capacity)
+        city = self.N
+        self.N += 1
+        self._coordinates[city] = coordinates
+        self._alive[city] = True
+        self._insert(city)
+        return city
+
+    def remove_city(self, city):
+        """
+        :param city: the index of the city that is removed, it keeps the index without any connections
+        """
+        self._check(city)
+        self._detach(city)
+        self._alive[city] = False
+
+    def move_city(self, city, coordinates):
+        """
+        :param city: the index of the city that is moved
+        :param coordinates: the new [x, y] coordinates of the city
+        """
+        self._check(city)
+        self._detach(city)
+        self._coordinates[city] = coordinates
+        self._insert(city)
+
+    def undirected_graph(self):
+        """
+        :return: a csr matrix like the one from make_undirected for the current cities, removed cities have no
+                 connections. It is only built again after a change
+        """
+        if self._graph is None:
+            self._flush()
+            self._graph = csr_matrix((self._data, self._indices, self._indptr), shape=(self.N, self.N))
+        return self._graph
+
+    def graph(self):
+        """
+        :return: a csr matrix like the one from construct_graph for the current cities, every connection is stored
+                 once from the city with the lower index
+        """
+        graph = self.undirected_graph()
+        rows = np.repeat(np.arange(self.N), np.diff(graph.indptr))
+        upper = graph.indices > rows
+        indptr = np.zeros(self.N + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows[upper], minlength=self.N), out=indptr[1:])
+        return csr_matrix((graph.data[upper], graph.indices[upper], indptr), shape=(self.N, self.N))
+
+    def graph_connections(self):
+        """
+        :return: the connections and distances in the same form and order as construct_fast_graph_connections
+        """
+        graph = self.graph().tocoo()
+        key = graph.row.astype(np.int64) * self.N + graph.col
+        order = np.argsort(key)
+        return np.column_stack(np.divmod(key[order], self.N)).reshape(-1, 2), graph.data[order]
+
+    def _check(self, city):
+        """
+        :param city: a city index that has to be alive
+        """
+        if not self.is_alive(city):
+            raise KeyError('there is no city %r' % (city,))
+
+    def _cell(self, city):
+        """
+        :param city: a city index
+        :return: the grid cell of the city
+        """
+        x, y = self._coordinates[city]
+        return math.floor(x / self._cell_size), math.floor(y / self._cell_size)
+
+    def _row(self, city, changed=True):
+        """
+        :param city: a city index
+        :param changed: if True the row is kept as a dictionary that can be changed until the next export
+        :return: a dictionary with the neighbours of the city and their distances
+        """
+        row = self._rows.get(city)
+        if row is None:
+            row = {}
+            if city < len(self._indptr) - 1:
+                lo, hi = self._indptr[city], self._indptr[city + 1]
+                row = dict(zip(self._indices[lo:hi].tolist(), self._data[lo:hi].tolist()))
+            if changed:
+                self._rows[city] = row
+        return row
+
+    def _insert(self, city):
+        """
+        :param city: a city that is not in the grid yet, it is added and connected to every city within the radius
+        """
+        cx, cy = self._cell(city)
+        candidates = [other for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                      for other in self._cells.get((cx + dx, cy + dy), ())]
+        self._cells.setdefault((cx, cy), set()).add(city)
+        row = self._row(city)
+        if candidates:
+            candidates = np.array(candidates)
+            # The same formula as construct_fast_graph_connections, so the graph equals one that is built from scratch
+            diff = self._coordinates[candidates] - self._coordinates[city]
+            distance2 = (diff ** 2).sum(axis=1)
+            close = distance2 <= self.radius * self.radius
+            for other, distance in zip(candidates[close].tolist(), np.sqrt(distance2[close]).tolist()):
+                row[other] = distance
+                self._row(other)[city] = distance
+        self._graph = None
+
+    def _detach(self, city):
+        """
+        :param city: a city that is removed from the grid together with all of its connections
+        """
+        cell = self._cell(city)
+        self._cells[cell].discard(city)
+        if not self._cells[cell]:
+            del self._cells[cell]
+        row = self._row(city)
+        for other in row:
+            del self._row(other)[city]
+        row.clear()
+        self._graph = None
+
+    def _flush(self):
+        """
+        Writes the changed rows back into the csr arrays, the other rows are copied without looking at them one by one.
+        """
+        old_N = len(self._indptr) - 1
+        changed = np.zeros(self.N, dtype=bool)
+        cities = np.fromiter(self._rows, dtype=np.int64, count=len(self._rows))
+        changed[cities] = True
+
+        degree = np.zeros(self.N, dtype=np.int64)
+        degree[:old_N] = np.diff(self._indptr)
+        degree[cities] = [len(self._rows[city]) for city in cities.tolist()]
+        indptr = np.zeros(self.N + 1, dtype=np.int64)
+        np.cumsum(degree, out=indptr[1:])
+        indices = np.empty(indptr[-1], dtype=self._indices.dtype)
+        data = np.empty(indptr[-1], dtype=np.float64)
+
+        # A kept entry moves by as much as the start of its row moved
+        old_rows = np.repeat(np.arange(old_N), np.diff(self._indptr))
+        kept = ~changed[old_rows]
+        position = np.flatnonzero(kept) + (indptr[old_rows[kept]] - self._indptr[old_rows[kept]])
+        indices[position] = self._indices[kept]
+        data[position] = self._data[kept]
+
+        for city in cities.tolist():
+            row = self._rows[city]
+            lo, hi = indptr[city], indptr[city + 1]
+            indices[lo:hi] = list(row)
+            data[lo:hi] = list(row.values())
+
+        self._indptr, self._indices, self._data = indptr, indices, data
+        self._rows = {}
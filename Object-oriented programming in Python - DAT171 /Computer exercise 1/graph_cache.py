@@ -0,0 +1,132 @@
+# Computer exercise 1 - persistent cache of the graphs built from the coordinate files
+
+import os
+import zipfile
+import numpy as np
+from scipy.sparse import csr_matrix
+from components import ComponentIndex
+from shortest_path import _write_atomic, file_digest
+
+
+class GraphCache:
+    """ A directory with one .npz file per graph, keyed by the coordinate file digest and the radius """
+
+    def __init__(self, directory, max_bytes=1 << 30):
+        """
+        :param directory: the directory the graphs are stored in, it is created when needed
+        :param max_bytes: the disk budget, the least recently used graphs are removed when it is exceeded
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._digests = {}
+
+    def path(self, filename, radius):
+        """
+        :param filename: a coordinate file
+        :param radius: the radius the graph is built with
+        :return: the path of the cached graph
+        """
+        stat = os.stat(filename)
+        # The digest is only computed again when the file changed since the last call
+        stamp = (os.fspath(filename), stat.st_size, stat.st_mtime_ns)
+        if stamp not in self._digests:
+            self._digests[stamp] = file_digest(filename)
+        return os.path.join(self.directory, '%s-r%r.npz' % (self._digests[stamp], float(radius)))
+
+    def load(self, filename, radius):
+        """
+        :param filename: a coordinate file
+        :param radius: the radius the graph is built with
+        :return: the cached csr matrix, memory-mapped when possible, or None if it is not in the cache
+        """
+        path = self.path(filename, radius)
+        try:
+            arrays = load_npz_arrays(path)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+        try:
+            os.utime(path)  # the modification time is used as the last access time
+        except OSError:
+            pass  # a read-only cache is still used, it only loses the order of eviction
+        return csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=tuple(arrays['shape']))
+
+    def load_components(self, filename, radius):
+        """
+        :param filename: a coordinate file
+        :param radius: the radius the graph is built with
+        :return: the ComponentIndex that was stored with the graph, or None if it is not in the cache
+        """
+        try:
+            return ComponentIndex(load_npz_arrays(self.path(filename, radius))['labels'])
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+
+    def store(self, filename, radius, graph, components=None):
+        """
+        :param filename: a coordinate file
+        :param radius: the radius the graph is built with
+        :param graph: the csr matrix that is stored
+        :param components: the ComponentIndex of the graph, it is computed when it is not given
+        """
+        if components is None:
+            components = ComponentIndex.from_graph(graph)
+        arrays = {'data': graph.data, 'indices': graph.indices, 'indptr': graph.indptr,
+                  'shape': np.array(graph.shape), 'labels': components.labels}
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            _write_atomic(self.path(filename, radius), lambda file: np.savez(file, **arrays))
+            self.evict()
+        except OSError:
+            pass  # a cache that can not be written only means that the next run builds the graph again
+
+    def evict(self):
+        """
+        Removes the least recently used graphs until the cache fits in max_bytes.
+        """
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.npz')]
+        except FileNotFoundError:
+            return
+        entries = sorted((entry.stat().st_mtime_ns, entry.stat().st_size, entry.path) for entry in entries)
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def load_npz_arrays(path):
+    """
+    :param path: an .npz file
+    :return: a dictionary with the arrays in the file, the uncompressed ones are memory-mapped
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as file:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')]
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+            # The local header has a fixed size of 30 bytes followed by the name and an extra field of its own length
+            file.seek(info.header_offset + 26)
+            name_length, extra_length = np.frombuffer(file.read(4), dtype='<u2')
+            file.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+            version = np.lib.format.read_magic(file)
+            read_header = {(1, 0): np.lib.format.read_array_header_1_0,
+                           (2, 0): np.lib.format.read_array_header_2_0}.get(version)
+            if read_header is None:
+                raise ValueError('%s has an unknown .npy version %r' % (info.filename, version))
+            shape, fortran_order, dtype = read_header(file)
+            if dtype.hasobject:
+                raise ValueError('%s contains Python objects' % info.filename)
+            if 0 in shape:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=file.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    return arrays
@@ -0,0 +1,91 @@
+# Computer exercise 1 - uniform grid as a NumPy-only neighbour index for construct_fast_graph_connections
+
+import math
+import time
+import numpy as np
+
+
+def grid_pairs(coord_list, radius, block_size=1 << 22):
+    """
+    :param coord_list: a numpy array with the coordinates of each city
+    :param radius: the maximum radius between the cities
+    :param block_size: the largest number of candidate pairs that are compared at a time
+    :return: an array with every pair [i, j], i < j, of cities that are at most radius apart, in no special order
+    """
+    N = len(coord_list)
+    if N < 2:
+        return np.empty((0, 2), dtype=np.int64)
+
+    # Every city gets the cell of size radius it is in, one empty row of cells on each side of y keeps the
+    # neighbours of a cell from wrapping around to the next column. Any cell size from radius up finds every pair,
+    # so radius 0 uses cells of size 1 and still finds the cities at the same coordinates
+    cell_size = radius if radius > 0 else 1.
+    cell_xy = np.floor((coord_list - coord_list.min(axis=0)) / cell_size).astype(np.int64)
+    height = int(cell_xy[:, 1].max()) + 3
+    cell = cell_xy[:, 0] * height + cell_xy[:, 1] + 1
+    order = np.argsort(cell, kind='stable')
+    cell = cell[order]
+    x = np.ascontiguousarray(coord_list[order, 0])
+    y = np.ascontiguousarray(coord_list[order, 1])
+
+    # Sorted by cell, the candidates of a city are two runs: the rest of its own cell with the cell above it, and the
+    # three cells next to them in the following column. Every pair of cells is then compared once
+    position = np.arange(N)
+    runs = ((position + 1, np.searchsorted(cell, cell + 2)),
+            (np.searchsorted(cell, cell + height - 1), np.searchsorted(cell, cell + height + 2)))
+
+    pairs = []
+    radius2 = radius * radius
+    for lo, hi in runs:
+        sizes = hi - lo
+        ends = np.cumsum(sizes)
+        first = 0
+        while first < N:
+            # The blocks are cut between cities, so one city with very many candidates can exceed block_size
+            last = max(int(np.searchsorted(ends, ends[first] - sizes[first] + block_size, side='right')), first + 1)
+            block = sizes[first:last]
+            i = np.repeat(position[first:last], block)
+            j = np.arange(len(i)) + np.repeat(lo[first:last] - (np.cumsum(block) - block), block)
+            dx = x[i] - x[j]
+            dy = y[i] - y[j]
+            close = dx * dx + dy * dy <= radius2
+            pairs.append((order[i[close]], order[j[close]]))
+            first = last
+
+    i = np.concatenate([i for i, _ in pairs])
+    j = np.concatenate([j for _, j in pairs])
+    return np.column_stack((np.minimum(i, j), np.maximum(i, j)))
+
+
+def benchmark(N=20000, neighbours=(2, 8, 32, 128), slow_limit=2000, seed=0):
+    """
+    :param N: the number of uniform random cities
+    :param neighbours: the average number of neighbours within the radius, one density for each
+    :param slow_limit: construction_graph_connections is only timed on the first slow_limit cities
+    :param seed: the seed of the random cities
+    :return: a list with the density, the number of connections and the seconds of every builder
+    """
+    from shortest_path import construct_fast_graph_connections, construction_graph_connections
+
+    coord_list = np.random.default_rng(seed).random((N, 2))
+    results = []
+    for k in neighbours:
+        radius = math.sqrt(k / (math.pi * N))
+        times = {}
+        for method in ('kdtree', 'grid'):
+            start = time.perf_counter()
+            connections, _ = construct_fast_graph_connections(coord_list, radius, method=method)
+            times[method] = time.perf_counter() - start
+        start = time.perf_counter()
+        construction_graph_connections(coord_list[:slow_limit], radius)
+        times['slow'] = (time.perf_counter() - start) * (N / slow_limit) ** 2  # it grows with N squared
+        results.append({'neighbours': k, 'radius': radius, 'connections': len(connections), 'seconds': times})
+    return results
+
+
+if __name__ == '__main__':
+    print('%10s %12s %10s %10s %12s' % ('neighbours', 'connections', 'kdtree', 'grid', 'slow (est.)'))
+    for result in benchmark():
+        seconds = result['seconds']
+        print('%10d %12d %10.4f %10.4f %12.1f' % (result['neighbours'], result['connections'], seconds['kdtree'],
+                                                  seconds['grid'], seconds['slow']))
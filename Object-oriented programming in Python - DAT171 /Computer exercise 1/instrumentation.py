@@ -0,0 +1,191 @@
+# Computer exercise 1 - timing, memory and profiling of the stages of the shortest path pipeline
+
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import pstats
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows, the resident set size is then not recorded
+    resource = None
+
+# The recorder of the active recording, None when nothing is recorded
+_recorder = None
+
+
+class Recorder:
+    """ The stage records of one recording, with export to JSON and to the Prometheus text format """
+
+    def __init__(self, memory=False, profile=False):
+        """
+        :param memory: if True tracemalloc measures the peak memory that every stage allocates
+        :param profile: if True every outermost stage is run under cProfile
+        """
+        self.memory = memory
+        self.profile = profile
+        self.records = []
+        self.profiles = {}
+        self._stack = []
+
+    def stage(self, name, function, args, kwargs, counts):
+        """
+        :param name: the name of the stage
+        :param function: the function of the stage
+        :param args: the positional arguments of the call
+        :param kwargs: the keyword arguments of the call
+        :param counts: a function (args, kwargs, result) -> dictionary with the node, edge and settled counts, or None
+        :return: the result of the call
+        """
+        frame = {}
+        if self.memory:
+            # A stage inside another one resets the peak, so the outer stage keeps the peak it has seen so far
+            traced, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            frame['base'] = frame['peak'] = traced
+            tracemalloc.reset_peak()
+        profiler = None
+        if self.profile and not any('profiler' in outer for outer in self._stack):
+            profiler = frame['profiler'] = cProfile.Profile()
+        self._stack.append(frame)
+
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                result = profiler.runcall(function, *args, **kwargs)
+            else:
+                result = function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            self._stack.pop()
+
+        record = {'stage': name, 'seconds': seconds, 'depth': len(self._stack)}
+        if resource is not None:
+            record['max_rss_bytes'] = _max_rss_bytes()
+        if self.memory:
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            record['peak_bytes'] = peak - frame['base']
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+        if profiler is not None:
+            if name in self.profiles:
+                self.profiles[name].add(profiler)
+            else:
+                self.profiles[name] = pstats.Stats(profiler)
+        if counts is not None:
+            record.update(counts(args, kwargs, result))
+        self.records.append(record)
+        return result
+
+    def summary(self):
+        """
+        :return: a dictionary with the number of calls, the total seconds, the largest peak memory and the last
+                 counts of every stage, in the order the stages first finished
+        """
+        stages = {}
+        for record in self.records:
+            stage = stages.setdefault(record['stage'], {'calls': 0, 'seconds': 0.})
+            stage['calls'] += 1
+            stage['seconds'] += record['seconds']
+            for key, value in record.items():
+                if key in ('peak_bytes', 'max_rss_bytes'):
+                    stage[key] = max(stage.get(key, 0), value)
+                elif key not in ('stage', 'seconds', 'depth'):
+                    stage[key] = value
+        return stages
+
+    def to_json(self, indent=None):
+        """
+        :param indent: the indent of the JSON text
+        :return: the records and the summary as JSON
+        """
+        return json.dumps({'records': self.records, 'summary': self.summary()}, indent=indent)
+
+    def to_prometheus(self, prefix='shortest_path'):
+        """
+        :param prefix: the prefix of the metric names
+        :return: the summary in the Prometheus text exposition format
+        """
+        metrics = [('stage_calls_total', 'counter', 'calls', 'Number of calls of the stage'),
+                   ('stage_seconds_total', 'counter', 'seconds', 'Wall time spent in the stage'),
+                   ('stage_peak_bytes', 'gauge', 'peak_bytes', 'Largest traced memory peak of the stage'),
+                   ('stage_max_rss_bytes', 'gauge', 'max_rss_bytes', 'Maximum resident set size after the stage'),
+                   ('stage_nodes', 'gauge', 'nodes', 'Number of cities in the last call of the stage'),
+                   ('stage_edges', 'gauge', 'edges', 'Number of connections in the last call of the stage'),
+                   ('stage_settled', 'gauge', 'settled', 'Number of settled cities in the last call of the stage')]
+        summary = self.summary()
+        lines = []
+        for name, kind, key, text in metrics:
+            values = [(stage, values[key]) for stage, values in summary.items() if key in values]
+            if not values:
+                continue
+            lines.append('# HELP %s_%s %s' % (prefix, name, text))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+            lines.extend('%s_%s{stage="%s"} %r' % (prefix, name, stage, value) for stage, value in values)
+        return '\n'.join(lines) + '\n'
+
+    def profile_report(self, stage, limit=20, sort='cumulative'):
+        """
+        :param stage: the name of a profiled stage
+        :param limit: the number of functions in the report
+        :param sort: the pstats sort key
+        :return: the cProfile report of the stage as text
+        """
+        out = io.StringIO()
+        stats = self.profiles[stage]
+        stats.stream = out
+        stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+@contextlib.contextmanager
+def recording(memory=False, profile=False):
+    """
+    :param memory: if True tracemalloc measures the peak memory of every stage, this slows down allocations
+    :param profile: if True every outermost stage is run under cProfile
+    :return: a context manager that gives the Recorder of the stages that run inside it
+    """
+    global _recorder
+    recorder = Recorder(memory, profile)
+    outer = _recorder
+    started = memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    _recorder = recorder
+    try:
+        yield recorder
+    finally:
+        _recorder = outer
+        if started:
+            tracemalloc.stop()
+
+
+def instrument(name, counts=None):
+    """
+    :param name: the name of the stage
+    :param counts: a function (args, kwargs, result) -> dictionary with counts that are added to every record
+    :return: a decorator that records every call of the function while a recording is active
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return function(*args, **kwargs)  # the only cost when nothing is recorded
+            return _recorder.stage(name, function, args, kwargs, counts)
+        return wrapper
+    return decorator
+
+
+def _max_rss_bytes():
+    """
+    :return: the maximum resident set size of the process so far
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024  # macOS counts bytes, Linux kilobytes
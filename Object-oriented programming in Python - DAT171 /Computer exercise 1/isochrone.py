@@ -0,0 +1,65 @@
+# Computer exercise 1 - every city that can be reached from a start city within a distance budget
+
+import collections
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+# The isochrone of sources[k] is cities[indptr[k]:indptr[k + 1]] with the matching distances, sorted by city
+Isochrone = collections.namedtuple('Isochrone', ['sources', 'indptr', 'cities', 'distances'])
+
+
+def isochrones(graph, sources, budget, directed=False, chunk_size=64):
+    """
+    :param graph: The csr matrix from construct_graph
+    :param sources: the start cities
+    :param budget: the largest distance from a start city, cities at exactly this distance are included
+    :param directed: if False the connections in graph can be used in both directions, like in find_shortest_path.
+                     For a graph from make_undirected directed=True gives the same result without building the
+                     transpose on every call
+    :param chunk_size: the number of start cities that are searched with one dijkstra call
+    :return: an Isochrone with the int32 cities and float32 distances of every start city
+    """
+    # dijkstra stops every search at the budget, only the distance rows of one chunk are kept at a time
+    sources = np.atleast_1d(np.asarray(sources, dtype=np.int64))
+    counts = [np.zeros(0, dtype=np.int64)]
+    cities = [np.zeros(0, dtype=np.int32)]
+    distances = [np.zeros(0, dtype=np.float32)]
+    for first in range(0, len(sources), chunk_size):
+        chunk = sources[first:first + chunk_size]
+        dist_matrix = dijkstra(graph, directed=directed, indices=chunk, limit=budget)
+        row, col = np.nonzero(dist_matrix <= budget)
+        counts.append(np.bincount(row, minlength=len(chunk)))
+        cities.append(col.astype(np.int32))
+        distances.append(dist_matrix[row, col].astype(np.float32))
+
+    indptr = np.zeros(len(sources) + 1, dtype=np.int64)
+    np.cumsum(np.concatenate(counts), out=indptr[1:])
+    return Isochrone(sources, indptr, np.concatenate(cities), np.concatenate(distances))
+
+
+def isochrone(graph, source, budget, directed=False):
+    """
+    :param graph: The csr matrix from construct_graph
+    :param source: the start city
+    :param budget: the largest distance from the start city
+    :param directed: if False the connections in graph can be used in both directions, like in find_shortest_path
+    :return: the int32 cities within the budget and their float32 distances, sorted by city
+    """
+    result = isochrones(graph, [source], budget, directed)
+    return result.cities, result.distances
+
+
+def combined_isochrone(graph, sources, budget, directed=False):
+    """
+    :param graph: The csr matrix from construct_graph
+    :param sources: the start cities
+    :param budget: the largest distance from the nearest start city
+    :param directed: if False the connections in graph can be used in both directions, like in find_shortest_path
+    :return: the int32 cities within the budget of any start city, their float32 distance to the nearest start city
+             and that start city, sorted by city
+    """
+    # One search from all start cities at once, it only costs as much as a single isochrone of the same area
+    dist_matrix, _, nearest = dijkstra(graph, directed=directed, indices=np.asarray(sources), limit=budget,
+                                       min_only=True, return_predecessors=True)
+    cities = np.flatnonzero(dist_matrix <= budget)
+    return cities.astype(np.int32), dist_matrix[cities].astype(np.float32), nearest[cities].astype(np.int32)
@@ -0,0 +1,101 @@
+# Computer exercise 1 - ALT (A*, landmarks and the triangle inequality) for goal-directed search
+
+import numpy as np
+from scipy.sparse.csgraph import connected_components, dijkstra
+from shortest_path import astar_search, make_undirected
+
+# float32 keeps about 7 digits, the bounds are lowered by this much of the distances so they stay admissible
+_FLOAT32_SLACK = 2.0 ** -22
+
+
+class LandmarkIndex:
+    """ Landmark distance tables over the graph from construct_graph, the connections are used in both directions """
+
+    def __init__(self, graph, landmarks, table):
+        """
+        :param graph: the undirected csr matrix from make_undirected
+        :param landmarks: the cities that are used as landmarks
+        :param table: a float32 array with the distance from every city (rows) to every landmark (columns)
+        """
+        self.graph = graph
+        self.landmarks = landmarks
+        self.table = table
+
+    @classmethod
+    def from_graph(cls, graph, k=16):
+        """
+        :param graph: The csr matrix from construct_graph
+        :param k: the number of landmarks
+        :return: the landmark index of the graph
+        """
+        graph = make_undirected(graph)
+        _, labels = connected_components(graph, directed=False)
+        largest = labels == np.argmax(np.bincount(labels))
+
+        # Farthest-point selection in the largest component: every new landmark is the city that is farthest from the
+        # landmarks chosen so far, so the landmarks end up spread out along the border of the country
+        dist_matrix = dijkstra(graph, directed=True, indices=int(np.argmax(largest)))
+        nearest = np.full(graph.shape[0], np.inf)
+        landmarks = []
+        rows = []
+        for _ in range(min(k, int(largest.sum()))):
+            landmark = int(np.argmax(np.where(largest, np.minimum(nearest, dist_matrix), -1)))
+            dist_matrix = dijkstra(graph, directed=True, indices=landmark)
+            nearest = np.minimum(nearest, dist_matrix)
+            landmarks.append(landmark)
+            rows.append(dist_matrix)
+
+        table = np.ascontiguousarray(np.array(rows, dtype=np.float32).reshape(len(rows), -1).T)
+        return cls(graph, np.array(landmarks, dtype=np.int32), table)
+
+    def save(self, filename):
+        """
+        :param filename: the .npz file the landmark tables are written to, the graph is not saved
+        """
+        np.savez(filename, landmarks=self.landmarks, table=self.table)
+
+    @classmethod
+    def load(cls, filename, graph):
+        """
+        :param filename: a .npz file written by save
+        :param graph: The csr matrix from construct_graph the index was built from
+        :return: the landmark index in the file
+        """
+        with np.load(filename) as arrays:
+            return cls(make_undirected(graph), arrays['landmarks'], arrays['table'])
+
+    def lower_bound(self, node, end_node):
+        """
+        :param node: a city
+        :param end_node: another city
+        :return: a lower bound of the distance between the two cities
+        """
+        return self._heuristic(end_node)(node)
+
+    def find_shortest_path(self, start_node, end_node, return_settled=False):
+        """
+        :param start_node: The first city
+        :param end_node: The last city
+        :param return_settled: if True the number of settled cities is returned as well
+        :return: the shortest path as a list of cities and its total distance, an empty path and inf if end_node
+                 can not be reached
+        """
+        return astar_search(self.graph, start_node, end_node, self._heuristic(end_node), return_settled)
+
+    def _heuristic(self, end_node):
+        """
+        :param end_node: the city the search is heading for
+        :return: a function with the landmark lower bound of the distance from a city to end_node
+        """
+        # By the triangle inequality |d(L, end) - d(L, v)| <= d(v, end) for every landmark L. The bound of every city
+        # is computed at once, so the search only looks it up instead of making numpy calls for every city it pushes
+        reached = np.isfinite(self.table[end_node])
+        if not reached.any():
+            return lambda v: 0.0  # the landmarks are in other components, the search falls back to Dijkstra
+        table = self.table[:, reached].astype(np.float64)
+        dist_end = table[end_node]
+        with np.errstate(invalid='ignore'):  # inf - inf for the cities in other components, they are replaced below
+            bound = (np.abs(dist_end - table) - _FLOAT32_SLACK * (dist_end + table)).max(axis=1)
+        # A city that a landmark can not reach is not in the same component as end_node
+        bound = np.where(np.isfinite(table).all(axis=1), np.maximum(bound, 0.0), np.inf)
+        return bound.tolist().__getitem__
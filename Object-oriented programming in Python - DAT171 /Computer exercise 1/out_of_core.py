@@ -0,0 +1,151 @@
+# Computer exercise 1 - building and routing on graphs whose connections do not fit in memory
+
+import math
+import os
+import numpy as np
+from scipy.sparse import csr_matrix
+from parallel_build import _tile_connections, _tile_tasks
+
+# The connection list on disk, one raw file per column
+EDGE_FILES = (('rows', np.int32), ('cols', np.int32), ('distances', np.float32))
+
+# csgraph only routes on int32 indices and row pointers, a larger graph would be upcast and copied into memory
+MAX_STORED_CONNECTIONS = 2 ** 31 - 1
+
+
+def build_disk_graph(coord_list, radius, directory, chunk_size=1 << 20, keep_edges=False):
+    """
+    :param coord_list: a numpy array with the coordinates of each city, it can be the memory map from
+                       read_coordinate_file(..., cache=True)
+    :param radius: the maximum radius between the cities
+    :param directory: the directory the connection files and the csr matrix are written to
+    :param chunk_size: the number of cities that are searched at a time
+    :param keep_edges: if False the connection files are removed when the csr matrix is written
+    :return: the memory-mapped csr matrix from load_disk_graph. Every connection is stored twice, so at most
+             MAX_STORED_CONNECTIONS / 2 connections (about 1.07 billion) are supported, see assemble_disk_graph
+    """
+    os.makedirs(directory, exist_ok=True)
+    write_edge_files(coord_list, radius, directory, chunk_size)
+    assemble_disk_graph(directory, len(coord_list), chunk_size)
+    if not keep_edges:
+        for name, _ in EDGE_FILES:
+            os.remove(os.path.join(directory, name + '.bin'))
+    return load_disk_graph(directory)
+
+
+def write_edge_files(coord_list, radius, directory, chunk_size=1 << 20):
+    """
+    :param coord_list: a numpy array with the coordinates of each city
+    :param radius: the maximum radius between the cities
+    :param directory: the directory the connection files are written to
+    :param chunk_size: the number of cities that are searched at a time
+    :return: the number of connections
+    """
+    # Only the connections of one strip of chunk_size cities are in memory at a time, see parallel_build
+    tiles = max(1, math.ceil(len(coord_list) / chunk_size))
+    files = [open(os.path.join(directory, name + '.bin'), 'wb') for name, _ in EDGE_FILES]
+    count = 0
+    try:
+        for task in _tile_tasks(coord_list, radius, tiles):
+            pairs = np.sort(_tile_connections(task), axis=1)
+            diff = coord_list[pairs[:, 0]] - coord_list[pairs[:, 1]]
+            columns = (pairs[:, 0], pairs[:, 1], np.sqrt((diff ** 2).sum(axis=1)))
+            for file, column, (_, dtype) in zip(files, columns, EDGE_FILES):
+                column.astype(dtype).tofile(file)
+            count += len(pairs)
+    finally:
+        for file in files:
+            file.close()
+    return count
+
+
+def read_edge_files(directory):
+    """
+    :param directory: a directory from write_edge_files
+    :return: the rows, columns and distances of the connections as read-only memory maps
+    """
+    columns = []
+    for name, dtype in EDGE_FILES:
+        path = os.path.join(directory, name + '.bin')
+        if os.path.getsize(path) == 0:
+            columns.append(np.empty(0, dtype=dtype))
+        else:
+            columns.append(np.memmap(path, dtype=dtype, mode='r'))
+    return tuple(columns)
+
+
+def assemble_disk_graph(directory, N, chunk_size=1 << 20):
+    """
+    :param directory: a directory from write_edge_files
+    :param N: the number of cities
+    :param chunk_size: the number of connections that are read at a time
+    :raises ValueError: if the graph would store more than MAX_STORED_CONNECTIONS connections, no csr array is
+                        written then
+    """
+    rows, cols, distances = read_edge_files(directory)
+
+    # First pass: the number of connections of every city, each connection is stored in both directions
+    degree = np.zeros(N, dtype=np.int64)
+    for first in range(0, len(rows), chunk_size):
+        degree += np.bincount(rows[first:first + chunk_size], minlength=N)
+        degree += np.bincount(cols[first:first + chunk_size], minlength=N)
+    nnz = int(degree.sum())
+    if nnz > MAX_STORED_CONNECTIONS:
+        raise ValueError('%d stored connections do not fit the int32 indices that csgraph routes on, the limit is %d'
+                         % (nnz, MAX_STORED_CONNECTIONS))
+
+    # The csgraph routines take int32 indices, a larger index type would make them copy the whole graph.
+    # The data is float64 for the same reason, the values are the float32 distances from the connection files
+    indptr = _open_array(directory, 'indptr', N + 1, np.int32)
+    indices = _open_array(directory, 'indices', nnz, np.int32)
+    data = _open_array(directory, 'data', nnz, np.float64)
+    indptr[0] = 0
+    np.cumsum(degree, out=indptr[1:])
+
+    # Second pass: every connection is written to the next free place in both of its rows
+    cursor = np.array(indptr[:-1], dtype=np.int64)
+    for first in range(0, len(rows), chunk_size):
+        row = rows[first:first + chunk_size]
+        col = cols[first:first + chunk_size]
+        source = np.concatenate((row, col)).astype(np.int64)
+        order = np.lexsort((np.concatenate((col, row)), source))
+        source = source[order]
+        start = np.ones(len(source), dtype=bool)
+        start[1:] = source[1:] != source[:-1]
+        group = np.flatnonzero(start)
+        rank = np.arange(len(source)) - np.repeat(group, np.diff(np.append(group, len(source))))
+        position = cursor[source] + rank
+        indices[position] = np.concatenate((col, row))[order]
+        data[position] = np.tile(distances[first:first + chunk_size], 2)[order]
+        cursor += np.bincount(source, minlength=N)
+
+    for array in (indptr, indices, data):
+        if isinstance(array, np.memmap):
+            array.flush()
+
+
+def load_disk_graph(directory):
+    """
+    :param directory: a directory from build_disk_graph or assemble_disk_graph
+    :return: the csr matrix with the arrays memory-mapped from the files, every connection is stored in both
+             directions, so it can be searched with directed=True like a graph from make_undirected
+    """
+    arrays = [np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+              for name in ('data', 'indices', 'indptr')]
+    N = len(arrays[2]) - 1
+    return csr_matrix(tuple(arrays), shape=(N, N), copy=False)
+
+
+def _open_array(directory, name, length, dtype):
+    """
+    :param directory: the directory of the graph
+    :param name: the name of the array
+    :param length: the length of the array
+    :param dtype: the type of the array
+    :return: a writable memory map of a new .npy file
+    """
+    path = os.path.join(directory, name + '.npy')
+    if length == 0:
+        np.save(path, np.empty(0, dtype=dtype))  # a file of zero bytes can not be memory-mapped
+        return np.empty(0, dtype=dtype)
+    return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(length,))
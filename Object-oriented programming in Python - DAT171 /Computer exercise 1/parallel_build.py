@@ -0,0 +1,66 @@
+# Computer exercise 1 - construct_fast_graph_connections split over spatial tiles and processes
+
+import multiprocessing
+import os
+import numpy as np
+from scipy.spatial import cKDTree
+from shortest_path import _sort_connections
+
+
+def construct_parallel_graph_connections(coord_list, radius, processes=None, tiles=None):
+    """
+    :param coord_list: a numpy array with the coordinates of each city
+    :param radius: the maximum radius between the cities
+    :param processes: the number of worker processes, None for one per core and 0 to build in this process
+    :param tiles: the number of tiles, the default is four per process so the workers stay busy
+    :return: the same connections and distances as construct_fast_graph_connections
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if tiles is None:
+        tiles = 4 * max(processes, 1)
+    tasks = list(_tile_tasks(coord_list, radius, tiles))
+
+    if processes <= 1:
+        pairs = [_tile_connections(task) for task in tasks]
+    else:
+        # The strips finish in any order, the connections are sorted into the serial order below
+        with multiprocessing.Pool(min(processes, len(tasks))) as pool:
+            pairs = list(pool.imap_unordered(_tile_connections, tasks))
+
+    pairs = np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+    connections = _sort_connections(np.sort(pairs, axis=1), len(coord_list))
+    diff = coord_list[connections[:, 0]] - coord_list[connections[:, 1]]
+    return connections, np.sqrt((diff ** 2).sum(axis=1))
+
+
+def _tile_tasks(coord_list, radius, tiles):
+    """
+    :param coord_list: a numpy array with the coordinates of each city
+    :param radius: the maximum radius between the cities
+    :param tiles: the number of tiles
+    :return: a generator with one (cities, coordinates, core_size, radius) task per tile
+    """
+    # The cities are cut into vertical strips with the same number of cities. A strip owns every connection whose
+    # leftmost city is in the strip, so its search also needs a halo of one radius to the right and no
+    # connection is found by two strips
+    order = np.argsort(coord_list[:, 0], kind='stable')
+    x = coord_list[order, 0]
+    bounds = np.linspace(0, len(order), tiles + 1).astype(np.int64)
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        if first == last:
+            continue
+        halo_end = np.searchsorted(x, x[last - 1] + radius, side='right')
+        cities = order[first:halo_end]
+        yield cities, coord_list[cities], last - first, radius
+
+
+def _tile_connections(task):
+    """
+    :param task: a (cities, coordinates, core_size, radius) task from _tile_tasks
+    :return: the connections the tile owns as pairs of city indices
+    """
+    cities, coordinates, core_size, radius = task
+    pairs = cKDTree(coordinates).query_pairs(r=radius, output_type='ndarray')
+    owned = pairs.min(axis=1) < core_size  # the first core_size cities are the strip itself, the rest is the halo
+    return cities[pairs[owned]]
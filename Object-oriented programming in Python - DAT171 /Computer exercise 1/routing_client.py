@@ -0,0 +1,126 @@
+# Computer exercise 1 - client for the routing daemon and a load test against it
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import time
+
+
+class RoutingClient:
+    """ A blocking client that sends one query at a time to a routing daemon on a Unix socket """
+
+    def __init__(self, path):
+        """
+        :param path: the Unix socket of the daemon
+        """
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.file = self.socket.makefile('rwb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def request(self, query):
+        """
+        :param query: a dictionary that is sent as one JSON line
+        :return: the decoded answer
+        """
+        self.file.write(json.dumps(query).encode() + b'\n')
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError('the routing daemon closed the connection')
+        return json.loads(line)
+
+    def route(self, start_node, end_node):
+        """
+        :param start_node: The first city
+        :param end_node: The last city
+        :return: the answer of the daemon with the path, the distance and the latency in milliseconds
+        """
+        return self.request({'from': start_node, 'to': end_node})
+
+    def stats(self):
+        """
+        :return: the counters of the daemon
+        """
+        return self.request({'stats': True})
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+async def load_test(path, N, clients=8, queries=200, sources=None, seed=0):
+    """
+    :param path: the Unix socket of the daemon
+    :param N: the number of cities in the graph of the daemon
+    :param clients: the number of connections that send queries at the same time
+    :param queries: the number of queries every connection sends, one after the other
+    :param sources: the number of different start cities, None for any city; fewer sources give more tree cache hits
+    :param seed: the seed of the random queries
+    :return: a dictionary with the throughput and the percentiles of the latency seen by the clients and the daemon
+    """
+    rng = random.Random(seed)
+    starts = list(range(N)) if sources is None else rng.sample(range(N), sources)
+    plans = [[(rng.choice(starts), rng.randrange(N)) for _ in range(queries)] for _ in range(clients)]
+
+    async def run(plan):
+        reader, writer = await asyncio.open_unix_connection(path)
+        latencies = []
+        for start_node, end_node in plan:
+            start = time.perf_counter()
+            writer.write(json.dumps({'from': start_node, 'to': end_node}).encode() + b'\n')
+            await writer.drain()
+            answer = json.loads(await reader.readline())
+            latencies.append(((time.perf_counter() - start) * 1000, answer['latency_ms']))
+        writer.close()
+        await writer.wait_closed()
+        return latencies
+
+    start = time.perf_counter()
+    latencies = [latency for result in await asyncio.gather(*map(run, plans)) for latency in result]
+    seconds = time.perf_counter() - start
+    return {'queries': len(latencies), 'seconds': seconds, 'queries_per_second': len(latencies) / seconds,
+            'client_ms': _percentiles([client for client, _ in latencies]),
+            'daemon_ms': _percentiles([daemon for _, daemon in latencies])}
+
+
+def _percentiles(values):
+    """
+    :param values: a list of numbers
+    :return: a dictionary with the 50th, 95th and 99th percentile and the maximum
+    """
+    values = sorted(values)
+    return {'p50': values[len(values) // 2], 'p95': values[int(len(values) * 0.95)],
+            'p99': values[int(len(values) * 0.99)], 'max': values[-1]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query a routing daemon or run a load test against it.')
+    parser.add_argument('socket', help='the Unix socket of the daemon')
+    parser.add_argument('queries', nargs='*', help='queries as FROM:TO, without any a load test is run')
+    parser.add_argument('--cities', type=int, default=12060, help='the number of cities for the load test')
+    parser.add_argument('--clients', type=int, default=8, help='the number of connections in the load test')
+    parser.add_argument('--per-client', type=int, default=200, help='the queries of every connection')
+    parser.add_argument('--sources', type=int, help='the number of different start cities in the load test')
+    args = parser.parse_args(argv)
+
+    if args.queries:
+        with RoutingClient(args.socket) as client:
+            for query in args.queries:
+                start_node, end_node = map(int, query.split(':'))
+                print(json.dumps(client.route(start_node, end_node)))
+        return
+
+    result = asyncio.run(load_test(args.socket, args.cities, args.clients, args.per_client, args.sources))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+# Computer exercise 1 - resident routing service that answers JSON-lines queries on a loaded graph
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import signal
+import stat
+import sys
+import time
+from components import ComponentIndex
+from graph_cache import GraphCache
+from shortest_path import construct_fast_graph_connections, construct_graph, make_undirected, read_coordinate_file
+from tree_cache import ShortestPathTreeCache
+
+
+class RoutingService:
+    """ Answers {"from": i, "to": j} queries on one graph that is loaded once """
+
+    def __init__(self, graph, components=None, tree_cache=None):
+        """
+        :param graph: a csr matrix with every connection in both directions, like the one from make_undirected
+        :param components: the ComponentIndex of the graph, it is computed when it is not given
+        :param tree_cache: the ShortestPathTreeCache that keeps the trees of recent start cities
+        """
+        self.graph = graph
+        self.components = ComponentIndex.from_graph(graph) if components is None else components
+        self.tree_cache = ShortestPathTreeCache() if tree_cache is None else tree_cache
+        self.queries = 0
+        self.errors = 0
+        self.seconds = 0.
+
+    @classmethod
+    def from_file(cls, filename, radius, cache_directory='.graph_cache'):
+        """
+        :param filename: a coordinate file
+        :param radius: the maximum radius between the cities
+        :param cache_directory: the GraphCache directory, None to always build the graph
+        :return: the service for the graph of the file
+        """
+        cache = None if cache_directory is None else GraphCache(cache_directory)
+        graph = None if cache is None else cache.load(filename, radius)
+        components = None if cache is None else cache.load_components(filename, radius)
+        if graph is None:
+            coord_list = read_coordinate_file(filename, cache=True)
+            connections, distances = construct_fast_graph_connections(coord_list, radius)
+            graph = construct_graph(connections, distances, len(coord_list))
+            components = ComponentIndex.from_graph(graph)
+            if cache is not None:
+                cache.store(filename, radius, graph, components)
+        return cls(make_undirected(graph), components)
+
+    def route(self, start_node, end_node):
+        """
+        :param start_node: The first city
+        :param end_node: The last city
+        :return: the shortest path as a list of cities and its distance, an empty path and inf if there is none
+        """
+        if not self.components.reachable(start_node, end_node):
+            return [], math.inf
+        return self.tree_cache.find_shortest_path(self.graph, start_node, end_node, directed=True)
+
+    def handle(self, line):
+        """
+        :param line: one JSON query, {"from": i, "to": j} with an optional "id" that is sent back, or {"stats": true}
+        :return: the JSON answer without a line break, the distance is null if there is no path
+        """
+        start = time.perf_counter()
+        query = None
+        try:
+            query = json.loads(line)
+            if not isinstance(query, dict):
+                raise ValueError('a query must be a JSON object')
+            if query.get('stats'):
+                return json.dumps(self.stats())
+            start_node, end_node = _city(query, 'from', self.graph.shape[0]), _city(query, 'to', self.graph.shape[0])
+            path, distance = self.route(start_node, end_node)
+            answer = {'from': start_node, 'to': end_node, 'path': path,
+                      'distance': None if math.isinf(distance) else distance}
+        except (ValueError, KeyError, TypeError) as error:
+            self.errors += 1
+            answer = {'error': str(error)}
+        if isinstance(query, dict) and 'id' in query:
+            answer['id'] = query['id']
+
+        latency = time.perf_counter() - start
+        self.queries += 1
+        self.seconds += latency
+        answer['latency_ms'] = latency * 1000
+        return json.dumps(answer)
+
+    def stats(self):
+        """
+        :return: a dictionary with the number of queries and errors, the mean latency and the tree cache counters
+        """
+        return {'queries': self.queries, 'errors': self.errors,
+                'mean_latency_ms': self.seconds * 1000 / self.queries if self.queries else 0.,
+                'tree_cache': self.tree_cache.stats()}
+
+    async def serve_client(self, reader, writer):
+        """
+        :param reader: the stream the queries are read from, one per line
+        :param writer: the stream the answers are written to, one per line in the same order
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    # One query takes milliseconds, so it is answered directly and other clients wait at most that long
+                    writer.write(self.handle(line).encode() + b'\n')
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def _city(query, key, N):
+    """
+    :param query: a decoded query
+    :param key: 'from' or 'to'
+    :param N: the number of cities
+    :return: the city of the key
+    """
+    city = query[key]
+    if isinstance(city, bool) or not isinstance(city, int) or not 0 <= city < N:
+        raise ValueError('%r must be a city between 0 and %d' % (key, N - 1))
+    return city
+
+
+async def serve_unix(service, path):
+    """
+    :param service: the RoutingService
+    :param path: the Unix socket the clients connect to, an old socket file is replaced
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    server = await asyncio.start_unix_server(service.serve_client, path=path)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+async def serve_stdio(service):
+    """
+    :param service: the RoutingService, it answers the queries on standard input until it is closed
+    """
+    loop = asyncio.get_running_loop()
+    mode = os.fstat(sys.stdin.fileno()).st_mode
+    if stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode) or stat.S_ISCHR(mode):
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        readline = reader.readline
+    else:
+        # The pipe transport refuses regular files, like the input of daemon < queries.jsonl, a file never blocks for
+        # long so it is read in a thread
+        def readline():
+            return loop.run_in_executor(None, sys.stdin.buffer.readline)
+    while True:
+        line = await readline()
+        if not line:
+            break
+        if line.strip():
+            sys.stdout.write(service.handle(line) + '\n')
+            sys.stdout.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Answer {"from": i, "to": j} JSON lines with shortest paths.')
+    parser.add_argument('filename', help='the coordinate file')
+    parser.add_argument('--radius', type=float, default=0.0025, help='the maximum radius between the cities')
+    parser.add_argument('--socket', help='serve on this Unix socket instead of standard input and output')
+    parser.add_argument('--cache', default='.graph_cache', help='the graph cache directory')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    service = RoutingService.from_file(args.filename, args.radius, args.cache)
+    print('Loaded %d cities in %.3f s' % (service.graph.shape[0], time.perf_counter() - start), file=sys.stderr)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # a terminated daemon also removes its socket
+    try:
+        asyncio.run(serve_stdio(service) if args.socket is None else serve_unix(service, args.socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# Computer exercise 1 - one copy of a graph in shared memory for all worker processes
+
+import sys
+from multiprocessing import shared_memory
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# The csr arrays that are shared, every one gets its own shared memory block
+ARRAYS = ('data', 'indices', 'indptr')
+
+# Before Python 3.13 every attached block is registered with the resource tracker of the process. The workers of a
+# multiprocessing pool share the tracker of the process that published the graph, so this does no harm there, but a
+# process that was started on its own would remove the blocks when it exits
+_ATTACH = {'track': False} if sys.version_info >= (3, 13) else {}
+
+
+class SharedGraph:
+    """ The csr arrays of a graph in shared memory blocks, published once and attached by the worker processes """
+
+    def __init__(self, handle, blocks, owner):
+        """
+        :param handle: the shape of the graph and the block name, dtype and length of every array
+        :param blocks: the SharedMemory block of every array
+        :param owner: True in the process that published the graph, only the owner removes the blocks
+        """
+        self.handle = handle
+        self.owner = owner
+        self._blocks = blocks
+        self._graph = None
+
+    @classmethod
+    def publish(cls, graph):
+        """
+        :param graph: a csr matrix, like the one from construct_graph. A graph from make_undirected searched with
+                      directed=True also saves every worker the transpose that dijkstra builds otherwise
+        :return: a SharedGraph that owns a copy of the csr arrays, its handle is all a worker needs to attach
+        """
+        # csr_matrix can change the index dtypes, the published arrays are the ones it keeps so attaching never copies
+        graph = csr_matrix((graph.data, graph.indices, graph.indptr), shape=graph.shape)
+        blocks = {}
+        arrays = {}
+        try:
+            for name in ARRAYS:
+                array = np.ascontiguousarray(getattr(graph, name))
+                blocks[name] = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))  # never empty
+                np.ndarray(array.shape, array.dtype, buffer=blocks[name].buf)[:] = array
+                arrays[name] = (blocks[name].name, array.dtype.str, len(array))
+        except BaseException:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+            raise
+        return cls({'shape': graph.shape, 'arrays': arrays}, blocks, owner=True)
+
+    @classmethod
+    def attach(cls, handle):
+        """
+        :param handle: the handle of a published SharedGraph
+        :return: a SharedGraph on the same blocks, nothing is copied
+        """
+        blocks = {}
+        try:
+            for name, (block_name, _, _) in handle['arrays'].items():
+                blocks[name] = shared_memory.SharedMemory(block_name, **_ATTACH)
+        except BaseException:
+            for block in blocks.values():
+                block.close()
+            raise
+        return cls(handle, blocks, owner=False)
+
+    def graph(self):
+        """
+        :return: a read-only csr matrix on the shared blocks, it can not be used any more after close
+        """
+        if self._blocks is None:
+            raise ValueError('the shared graph is closed')
+        if self._graph is None:
+            arrays = {}
+            for name, (_, dtype, length) in self.handle['arrays'].items():
+                arrays[name] = np.ndarray(length, dtype, buffer=self._blocks[name].buf)
+                arrays[name].flags.writeable = False  # a change would reach every worker
+            self._graph = csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=self.handle['shape'],
+                                     copy=False)
+        return self._graph
+
+    def nbytes(self):
+        """
+        :return: the number of bytes in the shared blocks
+        """
+        return sum(np.dtype(dtype).itemsize * length for _, dtype, length in self.handle['arrays'].values())
+
+    def close(self):
+        """
+        Detaches this process from the blocks, the owner also removes them. Workers that are still attached keep their
+        mapping until they close it or exit. Every matrix from graph() must be gone before close.
+        """
+        if self._blocks is None:
+            return
+        self._graph = None
+        blocks, self._blocks = self._blocks, None
+        if self.owner:
+            for block in blocks.values():
+                block.unlink()
+        for block in blocks.values():
+            block.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,38 +1,224 @@
+# matplotlib and the scipy modules are imported by the stages that use them, so a query on a cached graph never
+# loads matplotlib or cKDTree, see python -X importtime shortest_path.py --import-report
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.sparse import csr_matrix
-from matplotlib.collections import LineCollection
-from scipy.sparse.csgraph import shortest_path
-from scipy.spatial import cKDTree
-import time
+from grid_hash import grid_pairs
+from instrumentation import instrument
 import math
+import heapq
+import argparse
+import collections
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+import weakref
 
 # A code written by Nicole Adamah & Sofia Nilsson
 
+# Brackets and commas in the coordinate files, these are read as whitespace
+_COORDINATE_SEPARATORS = bytes.maketrans(b'{},', b'   ')
+# The bytes that bytes.split treats as whitespace
+_WHITESPACE = np.zeros(256, dtype=bool)
+_WHITESPACE[list(b' \t\n\r\x0b\x0c')] = True
+
+# Counts for the instrumentation records, see instrumentation.recording
+def _argument(args, kwargs, position, name):
+    return args[position] if len(args) > position else kwargs[name]
+
+def _city_counts(args, kwargs, result):
+    return {'nodes': len(result)}
+
+def _builder_counts(args, kwargs, result):
+    return {'nodes': len(_argument(args, kwargs, 0, 'coord_list')), 'edges': len(result[0])}
+
+def _graph_counts(args, kwargs, result):
+    return {'nodes': result.shape[0], 'edges': result.nnz}
+
+def _search_counts(args, kwargs, result):
+    graph = _argument(args, kwargs, 0, 'graph')
+    # dijkstra without a limit settles every city it can reach
+    return {'nodes': graph.shape[0], 'edges': graph.nnz, 'settled': int(np.count_nonzero(np.isfinite(result[1])))}
+
+def _plot_counts(args, kwargs, result):
+    return {'nodes': len(_argument(args, kwargs, 0, 'coord_list')), 'edges': len(_argument(args, kwargs, 1, 'indices'))}
+
 # Task 1
-def read_coordinate_file(filename):
+@instrument('read_coordinate_file', _city_counts)
+def read_coordinate_file(filename, project=True, chunk_size=1 << 24, cache=False, compact=False):
     """
     :param filename: The input filename receives a file with city coordinates
+    :param project: if False the raw latitude/longitude pairs are returned instead of the Mercator coordinates
+    :param chunk_size: the number of bytes that are parsed at a time
+    :param cache: if True the projected coordinates are saved in a binary sidecar next to the file and
+                  later calls memory-map the sidecar instead of parsing the text again
+    :param compact: if True the coordinates are float32, see COMPACT_TOLERANCE
     :return: returns a numpy array with coordinates without any special signs
     """
-    with open(filename) as file:
-        coordinates = []
-        for line in file:
-            a, b = line.strip('{' '}\n').split(',')  # takes out newlines and brackets
-            a, b = float(a), float(b)  # a is the latitude, b is the longitude
-            x, y = (np.pi * b / 180), np.log(
-                np.tan(np.pi / 4 + (np.pi * a) / 360))  # Convert a and b using the Mercator projection
-            coordinates.append([x, y])
-    return np.array(coordinates)  # converts the coordinates to a numpy array
+    if cache and project:
+        coordinates = _load_coordinate_cache(filename)
+        if coordinates is not None:
+            return coordinates.astype(np.float32) if compact else coordinates
+
+    lat_lon = _parse_coordinate_file(filename, chunk_size)
+    if not project:
+        return lat_lon.astype(np.float32) if compact else lat_lon
+
+    coordinates = mercator_projection(lat_lon)
+    if cache:
+        _save_coordinate_cache(filename, coordinates)
+    return coordinates.astype(np.float32) if compact else coordinates
+
+def _parse_coordinate_file(filename, chunk_size):
+    """
+    :param filename: a file with one {lat, lon} pair on every line
+    :param chunk_size: the number of bytes that are parsed at a time
+    :return: a numpy array with the latitude and longitude of every city
+    """
+    chunks = []
+    rest = b''
+    with open(filename, 'rb') as file:
+        while True:
+            block = file.read(chunk_size)
+            if not block:
+                break
+            block = rest + block
+            cut = block.rfind(b'\n') + 1  # only parse whole lines, the rest is kept for the next block
+            rest = block[cut:]
+            chunks.append(_parse_coordinate_block(block[:cut]))
+    chunks.append(_parse_coordinate_block(rest))
+    return np.concatenate(chunks).reshape(-1, 2)
+
+def _parse_coordinate_block(block):
+    """
+    :param block: bytes with whole lines of the form {lat, lon}
+    :return: a flat float64 array with the numbers in the block
+    """
+    # Brackets and commas are turned into whitespace so the block can be split into numbers in one go
+    text = block.translate(_COORDINATE_SEPARATORS)
+
+    # The flat list would silently pair the numbers of a broken line with the next one, so every line is checked to
+    # hold two numbers. A number starts where whitespace is followed by anything else
+    lines = block.count(b'\n') + (1 if block[block.rfind(b'\n') + 1:].strip() else 0)
+    chars = np.frombuffer(text, dtype=np.uint8)
+    space = _WHITESPACE[chars]
+    starts = np.flatnonzero(~space & np.concatenate(([True], space[:-1])))
+    line = np.cumsum(chars == ord('\n'))[starts]
+    wrong = np.flatnonzero(np.bincount(line, minlength=lines) != 2)
+    if len(wrong):
+        raise ValueError('expected 2 coordinates on every line, found %r' % block.split(b'\n')[wrong[0]])
+    return np.array(text.split(), dtype=np.float64)
+
+def mercator_projection(lat_lon):
+    """
+    :param lat_lon: a numpy array with latitudes in the first column and longitudes in the second
+    :return: a numpy array with the Mercator coordinates [x, y] of every point
+    """
+    a = lat_lon[:, 0]  # a is the latitude
+    b = lat_lon[:, 1]  # b is the longitude
+    coordinates = np.empty(lat_lon.shape, dtype=np.float64)
+    coordinates[:, 0] = np.pi * b / 180
+    coordinates[:, 1] = np.log(np.tan(np.pi / 4 + (np.pi * a) / 360))
+    return coordinates
+
+# Binary coordinate cache
+def file_digest(filename, chunk_size=1 << 24):
+    """
+    :param filename: the file that should be hashed
+    :param chunk_size: the number of bytes that are hashed at a time
+    :return: the blake2b hex digest of the file content
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def coordinate_cache_paths(filename):
+    """
+    :param filename: a coordinate file
+    :return: the paths of the binary sidecar and of its key file
+    """
+    filename = os.fspath(filename)
+    return filename + '.coords.npy', filename + '.coords.json'
+
+def _load_coordinate_cache(filename):
+    """
+    :param filename: a coordinate file
+    :return: the memory-mapped projected coordinates or None if there is no valid sidecar
+    """
+    data_path, key_path = coordinate_cache_paths(filename)
+    try:
+        with open(key_path) as file:
+            key = json.load(file)
+        stat = os.stat(filename)
+    except (OSError, ValueError):
+        return None
+
+    if key.get('size') != stat.st_size:
+        return None
+    # A file that was touched but not changed still matches its hash, then only the mtime is updated
+    if key.get('mtime_ns') != stat.st_mtime_ns:
+        if key.get('digest') != file_digest(filename):
+            return None
+        key['mtime_ns'] = stat.st_mtime_ns
+        _write_atomic(key_path, lambda file: file.write(json.dumps(key).encode()))
+
+    try:
+        return np.load(data_path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+
+def _save_coordinate_cache(filename, coordinates):
+    """
+    :param filename: a coordinate file
+    :param coordinates: the projected coordinates of the file
+    """
+    data_path, key_path = coordinate_cache_paths(filename)
+    stat = os.stat(filename)
+    key = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': file_digest(filename)}
+    try:
+        # The data is written before the key so a key never points at an old sidecar
+        _write_atomic(data_path, lambda file: np.save(file, coordinates))
+        _write_atomic(key_path, lambda file: file.write(json.dumps(key).encode()))
+    except OSError:
+        pass  # a read-only data directory only means that the next run parses the text again
+
+def _write_atomic(path, write):
+    """
+    :param path: the file that should be written
+    :param write: a function that writes the content to an open binary file
+    """
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=name + '.', suffix='.tmp', dir=directory or '.')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            write(file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
 
 # Task 2, 5, 7 (all the plots)
-def plot_points(coord_list, indices, path):
+@instrument('plot_points', _plot_counts)
+def plot_points(coord_list, indices, path, filename=None, density_threshold=100000, size=(8, 8), dpi=150):
     """
         :param coord_list: coord_list is the output from the read_coordinate_file
         :param indices: the connections between the points
         :param path: the shortest path from the function find_shortest_path
-        :return: returns the plot
+        :param filename: if given the plot is written to this .png or .svg file with the Agg backend instead of being
+                         shown, this also works on a server without a display
+        :param density_threshold: when writing to a file, more connections than this are drawn as a density image
+        :param size: the size of the written figure in inches
+        :param dpi: the dots per inch of the written figure
+        :return: returns the plot, or the written Figure when a filename is given
         """
+    if filename is not None:
+        return render_points(coord_list, indices, path, filename, density_threshold, size, dpi)
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+
     # Separates the coordinates in different arrays
     x = coord_list[:, 1]
     y = coord_list[:, 0]
@@ -41,8 +227,8 @@ def plot_points(coord_list, indices, path):
     line_segments = LineCollection(coord_list[indices], colors='k', alpha=0.2, linewidths=0.8, zorder=0)  # creates the lines between the points
     plt.gca().add_collection(line_segments)
 
-    x_shortest = coord_list[shortest][:, 1]  # x-coordinates for the shortest path
-    y_shortest = coord_list[shortest][:, 0]  # y-coordinates for the shortest path
+    x_shortest = coord_list[path][:, 1]  # x-coordinates for the shortest path
+    y_shortest = coord_list[path][:, 0]  # y-coordinates for the shortest path
 
     plt.axis('equal')
     plt.plot(y_shortest, x_shortest, 'r', zorder=2)  # plots the shortest path
@@ -51,11 +237,87 @@ def plot_points(coord_list, indices, path):
 
     return plott, line_segments
 
+def render_points(coord_list, indices, path, filename, density_threshold=100000, size=(8, 8), dpi=150):
+    """
+    :param coord_list: coord_list is the output from the read_coordinate_file
+    :param indices: the connections between the points
+    :param path: the shortest path from the function find_shortest_path
+    :param filename: the .png or .svg file the plot is written to, the format follows the extension
+    :param density_threshold: more connections than this are drawn as a density image instead of as lines
+    :param size: the size of the figure in inches
+    :param dpi: the dots per inch of the figure
+    :return: the written matplotlib Figure
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import LineCollection
+    from matplotlib.figure import Figure
+
+    # A Figure with its own Agg canvas does not touch pyplot, so no window or display is needed
+    figure = Figure(figsize=size, dpi=dpi)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    if len(indices) > density_threshold:
+        # The cost of the image only grows with the number of pixels once the connections are binned
+        image, extent = density_image(coord_list, indices, (int(size[1] * dpi), int(size[0] * dpi)))
+        axes.imshow(np.log1p(image), origin='lower', extent=extent, cmap='Greys', interpolation='nearest', zorder=0)
+    else:
+        axes.scatter(coord_list[:, 0], coord_list[:, 1], marker='o', s=10)
+        axes.add_collection(LineCollection(coord_list[indices], colors='k', alpha=0.2, linewidths=0.8, zorder=0))
+        axes.set_aspect('equal', adjustable='datalim')
+        axes.autoscale_view()
+    if len(path):
+        route = coord_list[np.asarray(path)]
+        axes.plot(route[:, 0], route[:, 1], 'r', zorder=2)  # the route stays a vector on top of the image
+    axes.set_title('City with coordinates and shortest path')
+    figure.savefig(filename)
+    return figure
+
+def density_image(coord_list, indices, shape, samples=16, chunk_size=1 << 20):
+    """
+    :param coord_list: coord_list is the output from the read_coordinate_file
+    :param indices: the connections between the points
+    :param shape: the largest (rows, columns) of the image, the pixels are square so one side is usually smaller
+    :param samples: the largest number of points a connection is sampled at, about one per pixel it crosses
+    :param chunk_size: the number of connections that are sampled at a time
+    :return: the image with the number of cities and connection samples in every pixel, and the extent
+             (left, right, bottom, top) of the image in coordinates
+    """
+    coord_list = np.asarray(coord_list, dtype=np.float64)
+    low = coord_list.min(axis=0)
+    span = np.maximum(coord_list.max(axis=0) - low, np.finfo(np.float64).tiny)
+    pixel = max(span[0] / shape[1], span[1] / shape[0])
+    columns = max(1, min(shape[1], math.ceil(span[0] / pixel)))
+    rows = max(1, min(shape[0], math.ceil(span[1] / pixel)))
+
+    def add(image, x, y):
+        # x and y are in pixels from the lower left corner, cities on the upper and right edge go to the last pixel
+        column = np.minimum(x, columns - 1).astype(np.int32)
+        row = np.minimum(y, rows - 1).astype(np.int32)
+        row *= columns
+        row += column
+        image += np.bincount(row, minlength=rows * columns)
+
+    image = np.zeros(rows * columns, dtype=np.int64)
+    pixels = (coord_list - low) / pixel
+    add(image, pixels[:, 0], pixels[:, 1])
+    indices = np.asarray(indices).reshape(-1, 2)
+    for first in range(0, len(indices), chunk_size):
+        start = pixels[indices[first:first + chunk_size, 0]].astype(np.float32)
+        step = pixels[indices[first:first + chunk_size, 1]].astype(np.float32) - start
+        # Every connection in the chunk gets the same samples, enough for the longest one to be drawn without gaps
+        count = int(min(samples, max(1, math.ceil(np.abs(step).max()))))
+        for offset in (np.arange(count, dtype=np.float32) + 0.5) / count:
+            add(image, start[:, 0] + offset * step[:, 0], start[:, 1] + offset * step[:, 1])
+    extent = (low[0], low[0] + columns * pixel, low[1], low[1] + rows * pixel)
+    return image.reshape(rows, columns), extent
+
 # Task 3
-def construction_graph_connections(coord_list, radius):
+@instrument('construction_graph_connections', _builder_counts)
+def construction_graph_connections(coord_list, radius, compact=False):
     """
     :param coord_list: the output from read_coordinate_file
     :param radius: given from the task, the maximum radius between cities
+    :param compact: if True the connections are int32 and the distances float32
     :return: a numpy array with connections between the cities and the distances between the cities
     """
     distances = []
@@ -70,9 +332,12 @@ def construction_graph_connections(coord_list, radius):
             if diff2 <= radius2:
                 connections.append([i, j])
                 distances.append(math.sqrt(diff2))
+    if compact:
+        return np.array(connections, dtype=np.int32).reshape(-1, 2), np.array(distances, dtype=np.float32)
     return np.array(connections), np.array(distances)
 
 # Task 4
+@instrument('construct_graph', _graph_counts)
 def construct_graph(indices, distance, N):
     """
     :param indices: a numpy array with the city indices
@@ -80,20 +345,72 @@ def construct_graph(indices, distance, N):
     :param N: the input for the function to know which matrix dimension it is going to create
     :return: the csr-matrix
     """
+    from scipy.sparse import csr_matrix
     row = indices[:, 0]
     col = indices[:, 1]
     # returns a sparse row matrix where each element at index [i, j] in the matrix is the distance between city i and j
     return csr_matrix((distance, (row, col)), shape=(N, N))
 
+def graph_connections(graph):
+    """
+    :param graph: The csr matrix from construct_graph
+    :return: the connections between the cities in the graph, the same array as construct_fast_graph_connections
+    """
+    row = np.repeat(np.arange(graph.shape[0]), np.diff(graph.indptr))
+    return np.column_stack((row, graph.indices))
+
+# Compact mode
+# With compact=True every coordinate is rounded to float32, which moves it at most 2**-24 times the largest absolute
+# coordinate, and the lengths are computed and stored in float32. A connection is then at most
+# COMPACT_TOLERANCE * abs(coord_list).max() longer or shorter than in float64, and a route of k connections at most k
+# times that. For Germany this is below 6e-7 per connection. Cities that are exactly one radius apart can end up on
+# either side of it.
+# Only the stored arrays are compact. The csgraph routines compute in float64, so find_shortest_path, the batch router
+# and every other csgraph search copy a compact graph to float64 data with its own indices on every call, that is the
+# routing_copy of memory_report. For the undirected Germany graph at r=0.01 one search peaks at 36 MB against 2.8 MB
+# for the float64 graph, the graph itself takes 22.4 MB compact and 33.5 MB in float64. find_astar_path and
+# astar_search read the float32 arrays in place.
+COMPACT_TOLERANCE = 2 ** -21
+
+def memory_report(coord_list, connections, distances, graph):
+    """
+    :param coord_list: the coordinates from read_coordinate_file
+    :param connections: the connections from one of the graph_connections functions
+    :param distances: the distances that belong to the connections
+    :param graph: The csr matrix from construct_graph or make_undirected
+    :return: a dictionary with the number of bytes of every stage and the total, float64_total and saving with the
+             total of the same stages without compact=True and how much less the arrays take, and routing_copy with
+             the bytes that every csgraph search copies, see COMPACT_TOLERANCE
+    """
+    report = {'coordinates': coord_list.nbytes,
+              'connections': connections.nbytes,
+              'distances': distances.nbytes,
+              'graph': graph.data.nbytes + graph.indices.nbytes + graph.indptr.nbytes}
+    report['total'] = sum(report.values())
+    # Without compact=True the coordinates, connections and distances take 8 bytes each, the csr indices are int32 in
+    # both modes
+    float64_graph = graph.nnz * 8 + graph.indices.nbytes + graph.indptr.nbytes
+    report['float64_total'] = (coord_list.size + connections.size + distances.size) * 8 + float64_graph
+    report['saving'] = report['float64_total'] - report['total']
+    report['routing_copy'] = 0 if graph.data.dtype == np.float64 else float64_graph
+    return report
+
 # Task 6
-def find_shortest_path(graph, start_node, end_node):
+@instrument('find_shortest_path', _search_counts)
+def find_shortest_path(graph, start_node, end_node, directed=False):
     """
     :param graph: The csr matrix from construct_graph
     :param start_node: The first city
     :param end_node: The last city
-    :return: The shortest way across the country
+    :param directed: if True the connections are only used in their stored direction, for a graph from
+                     make_undirected this gives the same result without building the transpose
+    :return: The shortest way across the country, an empty path if the last city can not be reached
     """
-    dist_matrix, predecessors = shortest_path(graph, directed=False, indices=start_node, return_predecessors=True)
+    from scipy.sparse.csgraph import dijkstra
+    # dijkstra searches the graph in place, shortest_path makes a copy of the whole graph first
+    dist_matrix, predecessors = dijkstra(graph, directed=directed, indices=start_node, return_predecessors=True)
+    if np.isinf(dist_matrix[end_node]):
+        return [], dist_matrix  # the last city is in another component
 
     last_c = end_node
     shortest = [last_c]
@@ -103,70 +420,338 @@ def find_shortest_path(graph, start_node, end_node):
 
     return shortest[-1::-1], dist_matrix
 
+def make_undirected(graph):
+    """
+    :param graph: The csr matrix from construct_graph, where every connection is only stored once
+    :return: a csr matrix with every connection in both directions, for parallel connections the shortest one is kept
+    """
+    from scipy.sparse import csr_matrix
+    N = graph.shape[0]
+    coo = graph.tocoo()
+    row = np.concatenate((coo.row, coo.col))
+    col = np.concatenate((coo.col, coo.row))
+    data = np.concatenate((coo.data, coo.data))
+
+    key = row.astype(np.int64) * N + col
+    order = np.lexsort((data, key))  # by connection and then by length, so the first of every connection is the shortest
+    key = key[order]
+    first = np.ones(len(key), dtype=bool)
+    first[1:] = key[1:] != key[:-1]
+    order = order[first]
+
+    return csr_matrix((data[order], (row[order], col[order])), shape=(N, N))
+
+# The make_undirected form of every graph that find_astar_path searched, by id until the graph is gone
+_UNDIRECTED = {}
+
+# Point-to-point search
+def find_astar_path(graph, coord_list, start_node, end_node, directed=False, return_settled=False):
+    """
+    :param graph: The csr matrix from construct_graph
+    :param coord_list: the coordinates of the cities, the straight line to the last city is used as the A* heuristic
+    :param start_node: The first city
+    :param end_node: The last city
+    :param directed: if True the connections are only used in their stored direction, like in find_shortest_path. If
+                     False the make_undirected form of graph is built on the first query and kept as long as graph
+                     lives, so graph must not be changed after that
+    :param return_settled: if True the number of settled cities is returned as well
+    :return: the shortest path as a list of cities and its total distance, an empty path and inf if end_node
+             can not be reached
+    """
+    if not directed:
+        key = id(graph)
+        if key not in _UNDIRECTED:
+            _UNDIRECTED[key] = make_undirected(graph)  # building it per query would cost more than the search
+            weakref.finalize(graph, _UNDIRECTED.pop, key, None)
+        graph = _UNDIRECTED[key]
+
+    # The search is a Python loop, it settles fewer cities than find_shortest_path but every city costs more. Over 100
+    # random Germany pairs it averages 12 ms against 5.4 ms for find_shortest_path with r=0.0025, it is only faster
+    # when the cities have many connections, 8 ms against 56 ms with r=0.01 and 6 ms against 144 ms with r=0.02
+    straight = np.hypot(coord_list[:, 0] - coord_list[end_node, 0], coord_list[:, 1] - coord_list[end_node, 1])
+
+    # The search stops as soon as the last city is settled, so only the cities close to the straight line are visited
+    return astar_search(graph, start_node, end_node, straight.tolist().__getitem__, return_settled)
+
+def astar_search(graph, start_node, end_node, heuristic, return_settled=False):
+    """
+    :param graph: a csr matrix where every connection that may be used is stored in its direction
+    :param start_node: The first city
+    :param end_node: The last city
+    :param heuristic: a function that gives a lower bound of the distance from a city to end_node
+    :param return_settled: if True the number of settled cities is returned as well
+    :return: the shortest path as a list of cities and its total distance, an empty path and inf if end_node
+             can not be reached
+    """
+    indptr, indices, data = graph.indptr, graph.indices, graph.data
+    distance = {start_node: 0.0}
+    predecessors = {start_node: -9999}
+    settled = set()
+    queue = [(heuristic(start_node), 0.0, start_node)]
+    while queue:
+        _, dist_u, u = heapq.heappop(queue)
+        if u in settled:
+            continue
+        settled.add(u)
+        if u == end_node:
+            break
+        lo, hi = indptr[u], indptr[u + 1]
+        for v, weight in zip(indices[lo:hi].tolist(), data[lo:hi].tolist()):
+            dist_v = dist_u + weight
+            if v not in settled and dist_v < distance.get(v, math.inf):
+                distance[v] = dist_v
+                predecessors[v] = u
+                heapq.heappush(queue, (dist_v + heuristic(v), dist_v, v))
+
+    if end_node in settled:
+        shortest = [end_node]
+        while predecessors[shortest[-1]] != -9999:
+            shortest.append(predecessors[shortest[-1]])
+        result = shortest[-1::-1], distance[end_node]
+    else:
+        result = [], math.inf
+
+    if return_settled:
+        return result + (len(settled),)
+    return result
+
 # task 9
-def construct_fast_graph_connections(coord_list, radius):
+@instrument('construct_fast_graph_connections', _builder_counts)
+def construct_fast_graph_connections(coord_list, radius, compact=False, method='kdtree'):
     """
     :param coord_list: a numpy array with the coordinates of each city
     :param radius: the maximum radius between the cities
+    :param compact: if True the connections are int32 and the distances float32
+    :param method: 'kdtree' for the cKDTree or 'grid' for the uniform grid in grid_hash, both give the same result
     :return: same output from task 3 but a faster version due to the cKDTree.
     """
+    if method == 'kdtree':
+        from scipy.spatial import cKDTree
+        # This class provides an index into a set of points which can be used to  look up the nearest neighbors of any points.
+        tree = cKDTree(coord_list)
+        # Find all pairs i < j within distance r of each other, this never includes a city paired with itself
+        pairs = tree.query_pairs(r=radius, output_type='ndarray')
+    elif method == 'grid':
+        pairs = grid_pairs(coord_list, radius)
+    else:
+        raise ValueError('unknown method %r, expected kdtree or grid' % (method,))
+    connections = _sort_connections(pairs, len(coord_list))
 
-    # This class provides an index into a set of points which can be used to  look up the nearest neighbors of any points.
-    tree = cKDTree(coord_list)
-    # Find all points within distance r of point(s) x
-    idx_fast = tree.query_ball_point(coord_list, r = radius)
+    diff = coord_list[connections[:, 0]] - coord_list[connections[:, 1]]
+    distance = np.sqrt((diff ** 2).sum(axis=1))
 
-    connections = []
+    if compact:
+        return connections.astype(np.int32), distance.astype(np.float32)
+    return connections, distance
+
+def _sort_connections(pairs, N):
+    """
+    :param pairs: an array with one [i, j] pair of city indices on every row
+    :param N: the number of cities
+    :return: the pairs sorted by the first and then the second city, the same order as construction_graph_connections
+    """
+    # Sorting one combined key is a lot faster than a lexsort over the two columns
+    key = pairs[:, 0].astype(np.int64) * N + pairs[:, 1]
+    key.sort()
+    return np.column_stack(np.divmod(key, N))
+
+# k nearest neighbours
+@instrument('construct_knn_graph_connections', _builder_counts)
+def construct_knn_graph_connections(coord_list, k, max_radius=None, compact=False):
+    """
+    :param coord_list: a numpy array with the coordinates of each city
+    :param k: the number of nearest cities every city is connected to
+    :param max_radius: if given, no connection is longer than this, like the radius of construct_fast_graph_connections
+    :param compact: if True the connections are int32 and the distances float32
+    :return: the connections and distances in the same form as construct_fast_graph_connections, at most k * N of them
+    """
+    N = len(coord_list)
+    if N < 2 or k < 1:
+        connections, distance = np.empty((0, 2), dtype=np.int64), np.empty(0)
+    else:
+        # The search bound is strict, the next larger float keeps the cities at exactly max_radius like the radius graph
+        from scipy.spatial import cKDTree
+        bound = np.inf if max_radius is None else np.nextafter(max_radius, np.inf)
+        _, neighbours = cKDTree(coord_list).query(coord_list, k=min(k + 1, N), distance_upper_bound=bound)
+        city = np.repeat(np.arange(N), neighbours.shape[1]).reshape(neighbours.shape)
+
+        # The city itself is one of its own nearest, unless more than k other cities have the same coordinates
+        keep = (neighbours != city) & (neighbours < N)  # N marks a missing neighbour beyond max_radius
+        keep &= np.cumsum(keep, axis=1) <= k
+        pairs = np.column_stack((city[keep], neighbours[keep]))
+
+        # A connection where both cities are among each other's nearest is found twice
+        connections = _sort_connections(np.sort(pairs, axis=1), N)
+        first = np.ones(len(connections), dtype=bool)
+        first[1:] = np.any(connections[1:] != connections[:-1], axis=1)
+        connections = connections[first]
+
+        diff = coord_list[connections[:, 0]] - coord_list[connections[:, 1]]
+        distance = np.sqrt((diff ** 2).sum(axis=1))
+
+    if compact:
+        return connections.astype(np.int32), distance.astype(np.float32)
+    return connections, distance
+
+# Radius sweep
+SweepResult = collections.namedtuple('SweepResult', ['radius', 'graph', 'components', 'path', 'distance'])
+
+def radius_sweep(coord_list, radii, start_node=None, end_node=None):
+    """
+    :param coord_list: a numpy array with the coordinates of each city
+    :param radii: the radii that are tried
+    :param start_node: The first city of the route that is searched for every radius, None for no route
+    :param end_node: The last city of the route
+    :return: a generator with a SweepResult for every radius, from the smallest to the largest radius, the graphs
+             have every connection in both directions like the ones from make_undirected
+    """
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import connected_components
+    # One neighbour search at the largest radius, every smaller radius uses the connections up to its distance
+    radii = sorted(radii)
+    N = len(coord_list)
+    connections, distances = construct_fast_graph_connections(coord_list, radii[-1])
+    order = np.argsort(distances, kind='stable')
+    distances = distances[order]
+
+    # Both directions of every connection, sorted by city and then by distance, so the connections of a city within a
+    # radius are the first ones of that city and a radius only has to cut every row instead of building a new matrix
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    rank = np.concatenate((rank, rank))
+    row = np.concatenate((connections[:, 0], connections[:, 1]))
+    col = np.concatenate((connections[:, 1], connections[:, 0]))
+    key = row * (len(order) + 1) + rank
+    entries = np.argsort(key)
+    key, col, data = key[entries], col[entries].astype(np.int32), distances[rank[entries]]
+    row_keys = np.arange(N, dtype=np.int64) * (len(order) + 1)
+    starts = np.searchsorted(key, row_keys)
+
+    for radius in radii:
+        counts = np.searchsorted(key, row_keys + np.searchsorted(distances, radius, side='right')) - starts
+        indptr = np.zeros(N + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(counts)
+        kept = np.arange(indptr[-1]) + np.repeat(starts - indptr[:-1], counts)
+        graph = csr_matrix((data[kept], col[kept], indptr), shape=(N, N))
+
+        # The matrix is symmetric, so the strong components are the components and no transpose is needed
+        n_components, labels = connected_components(graph, directed=True, connection='strong')
+        path, distance = None, None
+        if start_node is not None:
+            if labels[start_node] != labels[end_node]:
+                path, distance = [], math.inf
+            else:
+                shortest, dist_matrix = find_shortest_path(graph, start_node, end_node, directed=True)
+                path, distance = shortest, dist_matrix[end_node]
+        yield SweepResult(radius, graph, n_components, path, distance)
+
+# Command line
+BUILDERS = {'fast': 'construct_fast_graph_connections with the cKDTree',
+            'grid': 'construct_fast_graph_connections with the uniform grid',
+            'slow': 'construction_graph_connections, the O(N^2) loop'}
+
+def import_report(argv, limit=15):
+    """
+    :param argv: the command line arguments of the query that is measured
+    :param limit: the number of modules in the report
+    :return: the wall time of the query in a new python process in seconds, the seconds spent on the imports and a
+             list with the (cumulative seconds, own seconds, module) of the slowest top level imports, the same numbers
+             as python -X importtime gives
+    """
+    import subprocess
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', os.path.abspath(__file__)] + list(argv),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    wall = time.perf_counter() - start
+
+    imports = []
+    for line in result.stderr.splitlines():
+        fields = line.partition('import time:')[2].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header and the output of the query itself
+        # The nested imports are indented by two more spaces for every level
+        if len(fields[2]) - len(fields[2].lstrip()) == 1:
+            imports.append((int(fields[1]) / 1e6, int(fields[0]) / 1e6, fields[2].strip()))
+    imports.sort(reverse=True)
+    return wall, sum(cumulative for cumulative, _, _ in imports), imports[:limit]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Find the shortest path between two cities of a coordinate file.')
+    parser.add_argument('filename', help='the coordinate file, for example Data/GermanyCities.txt')
+    parser.add_argument('start', type=int, help='the first city')
+    parser.add_argument('end', type=int, help='the last city')
+    parser.add_argument('--radius', type=float, default=0.0025, help='the maximum radius between the cities')
+    parser.add_argument('--builder', choices=BUILDERS, default='fast',
+                        help='; '.join('%s: %s' % item for item in BUILDERS.items()))
+    parser.add_argument('--format', choices=('text', 'json'), default='text', help='the format of the answer')
+    parser.add_argument('--plot', metavar='FILE', help='write the cities and the route to this .png or .svg file')
+    parser.add_argument('--show', action='store_true', help='show the cities and the route in a window')
+    parser.add_argument('--cache', default='.graph_cache', help='the graph cache directory')
+    parser.add_argument('--no-cache', action='store_true', help='always build the graph from the coordinate file')
+    parser.add_argument('--compact', action='store_true',
+                        help='build the graph with float32 coordinates and distances and int32 connections, see '
+                             'COMPACT_TOLERANCE. The graph cache only holds float64 graphs, so it is not used')
+    parser.add_argument('--import-report', action='store_true',
+                        help='run the query in a new python process and print its slowest imports')
+    args = parser.parse_args(argv)
+
+    if args.import_report:
+        wall, imports, slowest = import_report(
+            [arg for arg in (sys.argv[1:] if argv is None else argv) if arg != '--import-report'])
+        print('Cold start %.3f s, of which %.3f s imports' % (wall, imports))
+        print('%12s %12s  %s' % ('cumulative', 'self', 'module'))
+        for cumulative, own, module in slowest:
+            print('%9.1f ms %9.1f ms  %s' % (cumulative * 1e3, own * 1e3, module))
+        return 0
+
+    # Every stage is timed by the instrumentation, recording(memory=True) also gives the peak memory of each stage
+    from instrumentation import recording
+    with recording() as recorder:
+        # A graph that was built before for the same file and radius is loaded from the cache, the coordinates are
+        # then only read for a plot
+        coord_list, graph, cache = None, None, None
+        if not args.no_cache and not args.compact:
+            from graph_cache import GraphCache
+            cache = GraphCache(args.cache)
+            graph = cache.load(args.filename, args.radius)
+        cached = graph is not None
+        if graph is None:
+            coord_list = read_coordinate_file(args.filename, cache=not args.no_cache, compact=args.compact)
+            if args.builder == 'slow':
+                con, dist = construction_graph_connections(coord_list, args.radius, compact=args.compact)
+            else:
+                con, dist = construct_fast_graph_connections(coord_list, args.radius, compact=args.compact,
+                                                             method='kdtree' if args.builder == 'fast' else 'grid')
+            graph = construct_graph(con, dist, len(coord_list))
+            if cache is not None:
+                cache.store(args.filename, args.radius, graph)
 
-    for i_city, neighbours in enumerate(idx_fast):
-        for j_city in neighbours:
-            if j_city >= i_city:
-                connections.append(np.array([i_city, j_city]))
+        for city in (args.start, args.end):
+            if not 0 <= city < graph.shape[0]:
+                parser.error('there is no city %d in %s, it has %d cities' % (city, args.filename, graph.shape[0]))
+        shortest, dist_matrix = find_shortest_path(graph, args.start, args.end)
 
-    connections = np.array(connections)
-    connect = np.array([coord_list[connections[:, 0]], [coord_list[connections[:, 1]]]], dtype=object)
-    distance = np.linalg.norm((connect[0]) - (connect[1]), axis=-1)
+        if args.plot is not None or args.show:
+            if coord_list is None:
+                coord_list = read_coordinate_file(args.filename, cache=True)
+            con = graph_connections(graph)
+            if args.plot is not None:
+                plot_points(coord_list, con, shortest, filename=args.plot)
+            if args.show:
+                plot_points(coord_list, con, shortest)
 
-    return connections, np.array(distance[0])
+    distance = float(dist_matrix[args.end])
+    if args.format == 'json':
+        seconds = {stage: values['seconds'] for stage, values in recorder.summary().items()}
+        print(json.dumps({'start': args.start, 'end': args.end, 'radius': args.radius, 'cached': cached,
+                          'path': [int(city) for city in shortest],
+                          'distance': None if math.isinf(distance) else distance, 'seconds': seconds}))
+    else:
+        for stage, values in recorder.summary().items():
+            print('%s: %.5f seconds' % (stage, values['seconds']))
+        print('\nThe shortest way is:', [int(city) for city in shortest])
+        print('The total distance is:', distance)
+    return 0
 
-# Calling on each function in the right order.
 if __name__ == "__main__":
-    start = time.time()
-    # ==================================================================================== #
-    coord_list = read_coordinate_file('GermanyCities.txt') # change input file manually
-    # ==================================================================================== #
-    end = time.time()
-    print('read_coordinate_file: %.5f seconds' % (end - start))
-
-    ## The changeable parameters
-    r = 0.0025 # change input file manually
-    start_node = 1573  # change input file manually
-    end_node = 10584 # change input file manually
-
-    # Switch between the fast version and the slow version, uncomment the version of choice
-    # ==================================================================================== #
-    t10 = time.time()
-    con, dist = construct_fast_graph_connections(coord_list, r) # Fast version
-    # con, dist = construction_graph_connections(coord_list, r) # Slow version
-    t11 = time.time()
-    print('construct_graph_connections: %.5f seconds' % (t11 - t10))
-    # ==================================================================================== #
-
-    t4 = time.time()
-    length = len(dist)
-    graph = construct_graph(con, dist, length)
-    t5 = time.time()
-    print('construction_graph: %.5f seconds ' % (t5 - t4))
-
-    t6 = time.time()
-    shortest, dist_matrix = find_shortest_path(graph, start_node, end_node)
-    t7 = time.time()
-    print('find_shortest_path: %.5f seconds' % (t7 - t6))
-
-    t8 = time.time()
-    plot_points(coord_list, con, shortest)
-    t9 = time.time()
-    print('plot_points: %.5f seconds ' % (t9 - t8))
-
-    print('\nThe shortest way is:', shortest)
-    print('The total distance is:', dist_matrix[end_node])
\ No newline at end of file
+    sys.exit(main())
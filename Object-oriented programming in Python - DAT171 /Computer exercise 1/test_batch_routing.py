@@ -0,0 +1,73 @@
+import math
+import numpy as np
+import pytest
+from shortest_path import *
+from batch_routing import distance_table, find_shortest_paths, group_queries
+from components import ComponentIndex
+
+
+def test_group_queries():
+    groups = group_queries([(3, 1), (5, 2), (3, 4), (7, 0)], group_size=2)
+    assert groups == [([3, 5], [(0, 0, 1), (2, 0, 4), (1, 1, 2)]), ([7], [(3, 0, 0)])]
+
+
+@pytest.mark.parametrize('processes, with_components', [(0, False), (2, False), (0, True)])
+def test_find_shortest_paths(processes, with_components):
+    coord_list = read_coordinate_file('Data/HungaryCities.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.005)
+    graph = construct_graph(connections, distances, len(coord_list))
+
+    rng = np.random.default_rng(0)
+    queries = [(int(rng.choice([1, 2, 3])), end_node) for end_node in rng.integers(0, len(coord_list), 40).tolist()]
+    components = ComponentIndex.from_graph(graph) if with_components else None
+    results = list(find_shortest_paths(graph, queries, processes=processes, group_size=2, components=components))
+    assert len(results) == len(queries)
+
+    for (start_node, end_node), (path, distance) in zip(queries, results):
+        shortest, dist_matrix = find_shortest_path(graph, start_node, end_node)
+        if math.isinf(dist_matrix[end_node]):
+            assert (path, distance) == ([], math.inf)
+        else:
+            assert path == [int(city) for city in shortest]
+            assert distance == dist_matrix[end_node]
+
+
+
+def test_find_shortest_paths_interleaved():
+    coord_list = read_coordinate_file('Data/SampleCoordinates.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.08)
+    graph = construct_graph(connections, distances, len(coord_list))
+    other = construct_graph(connections[:1], distances[:1], len(coord_list))
+
+    # Two generators in this process must not share their graph
+    first = find_shortest_paths(graph, [(0, 4), (4, 0)], processes=0, group_size=1)
+    assert next(first)[1] == find_shortest_path(graph, 0, 4)[1][4]
+    assert list(find_shortest_paths(other, [(0, 4)], processes=0))[0][1] == find_shortest_path(other, 0, 4)[1][4]
+    assert next(first)[1] == find_shortest_path(graph, 4, 0)[1][0]
+
+def test_distance_table():
+    coord_list = read_coordinate_file('Data/SampleCoordinates.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.08)
+    graph = construct_graph(connections, distances, len(coord_list))
+
+    table = distance_table(graph, [0, 4], [1, 0, 6], chunk_size=1)
+    assert table.dtype == np.float32
+    for row, start_node in enumerate([0, 4]):
+        dist_matrix = find_shortest_path(graph, start_node, 0)[1]
+        assert np.array_equal(table[row], dist_matrix[[1, 0, 6]].astype(np.float32))
+
+
+def test_component_index():
+    coord_list = read_coordinate_file('Data/SampleCoordinates.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.05)
+    graph = construct_graph(connections, distances, len(coord_list))
+    components = ComponentIndex.from_graph(graph)
+
+    report = components.report()
+    assert report['sizes'].sum() == len(coord_list)
+    assert report['largest_size'] == report['sizes'][report['largest']]
+    for start_node, end_node in [(0, 4), (0, 1), (2, 5)]:
+        path = find_shortest_path(graph, start_node, end_node)[0]
+        assert components.reachable(start_node, end_node) == bool(path)
+    assert components.reachable_queries([(0, 4), (0, 1)]).tolist() == [components.reachable(0, 4),
+                                                                        components.reachable(0, 1)]
@@ -0,0 +1,31 @@
+from shortest_path import *
+from benchmark import DISTRIBUTIONS, compare, coordinate_file, run_suite
+
+
+def test_coordinate_files(tmp_path):
+    for distribution in DISTRIBUTIONS:
+        filename = coordinate_file(tmp_path, distribution, 1000)
+        lat_lon = read_coordinate_file(filename, project=False)
+        assert lat_lon.shape == (1000, 2)
+        assert lat_lon[:, 0].min() >= 47 and lat_lon[:, 0].max() <= 55
+        assert coordinate_file(tmp_path, distribution, 1000) == filename  # the file is generated once
+
+
+def test_run_suite(tmp_path):
+    results = run_suite(sizes=(500,), directory=tmp_path, slow_limit=500)
+    assert [case['distribution'] for case in results['cases']] == list(DISTRIBUTIONS)
+    for case in results['cases']:
+        assert case['checks'] == dict.fromkeys(['grid_equals_kdtree', 'slow_equals_fast', 'undirected_search_agrees',
+                                                'astar_agrees', 'contraction_agrees'], True)
+        assert set(case['seconds']) >= {'parse', 'construction_graph_connections', 'construct_fast_graph_connections',
+                                        'construct_graph', 'find_shortest_path', 'contraction'}
+    assert compare(results, results) == []
+
+    slower = {'cases': [dict(case, seconds={stage: seconds * 2 + 1 for stage, seconds in case['seconds'].items()})
+                        for case in results['cases']]}
+    regressions = compare(slower, results)
+    assert len(regressions) == sum(len(case['seconds']) for case in results['cases'])
+    assert all(problem['ratio'] > 1.25 for problem in regressions)
+
+    slower['cases'][0]['checks']['astar_agrees'] = False
+    assert {'distribution': 'uniform', 'size': 500, 'check': 'astar_agrees'} in compare(slower, {'cases': []})
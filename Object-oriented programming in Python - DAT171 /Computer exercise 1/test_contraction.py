@@ -0,0 +1,69 @@
+import math
+import numpy as np
+import pytest
+from shortest_path import *
+from batch_routing import distance_table
+from benchmark import benchmark_radius, coordinate_file
+from contraction import ContractionHierarchy
+
+
+@pytest.fixture(scope='module')
+def hungary():
+    coord_list = read_coordinate_file('Data/HungaryCities.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.005)
+    return construct_graph(connections, distances, len(coord_list))
+
+
+# No core, a core table for the last cities, a core that is searched because no city may get shortcuts, and a graph
+# that fits in the core completely
+@pytest.fixture(scope='module', params=[(0, 256), (100, 256), (100, 0), (3000, 256)])
+def hierarchy(hungary, request):
+    core_size, max_shortcuts = request.param
+    return ContractionHierarchy.from_graph(hungary, core_size=core_size, max_shortcuts=max_shortcuts)
+
+
+def test_contraction_hierarchy(hungary, hierarchy, tmp_path):
+    hierarchy.save(tmp_path / 'hungary.npz')
+    hierarchy = ContractionHierarchy.load(tmp_path / 'hungary.npz')
+
+    rng = np.random.default_rng(0)
+    for start_node, end_node in rng.integers(0, hungary.shape[0], (50, 2)).tolist():
+        shortest, dist_matrix = find_shortest_path(hungary, start_node, end_node)
+        path, distance = hierarchy.find_shortest_path(start_node, end_node)
+        if math.isinf(dist_matrix[end_node]):
+            assert (path, distance) == ([], math.inf)
+            continue
+        assert distance == pytest.approx(dist_matrix[end_node])
+        assert path[0] == start_node and path[-1] == end_node
+        # The unpacked path only uses roads of the original graph
+        lengths = [max(hungary[u, v], hungary[v, u]) for u, v in zip(path[:-1], path[1:])]
+        assert all(lengths) and sum(lengths) == pytest.approx(distance)
+
+    assert hierarchy.find_shortest_path(7, 7) == ([7], 0.)
+
+
+def test_distance_table(hungary, hierarchy):
+    rng = np.random.default_rng(1)
+    sources = rng.integers(0, hungary.shape[0], 20)
+    targets = rng.integers(0, hungary.shape[0], 30)
+
+    table = hierarchy.distance_table(sources, targets)
+    assert table.dtype == np.float32 and table.shape == (20, 30)
+    expected = distance_table(hungary, sources, targets, chunk_size=7)
+    assert np.array_equal(np.isinf(table), np.isinf(expected))
+    assert np.allclose(table[np.isfinite(table)], expected[np.isfinite(expected)])
+
+
+def test_contraction_synthetic(tmp_path):
+    # Witnesses have to keep the hierarchy small on a graph that is much larger than the core
+    coord_list = read_coordinate_file(coordinate_file(tmp_path, 'uniform', 5000))
+    connections, distances = construct_fast_graph_connections(coord_list, benchmark_radius(5000, 8))
+    graph = construct_graph(connections, distances, len(coord_list))
+    hierarchy = ContractionHierarchy.from_graph(graph, core_size=200)
+    assert hierarchy.first_core == 4800 and len(hierarchy.core_distances) == 200
+    assert len(hierarchy.data) < 2 * len(distances)
+
+    rng = np.random.default_rng(2)
+    for start_node, end_node in rng.integers(0, len(coord_list), (20, 2)).tolist():
+        dist_matrix = find_shortest_path(graph, start_node, end_node)[1]
+        assert hierarchy.find_shortest_path(start_node, end_node)[1] == pytest.approx(dist_matrix[end_node])
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from shortest_path import *
+from dynamic_graph import DynamicGraph
+
+
+def rebuilt_connections(dynamic):
+    alive = np.flatnonzero([dynamic.is_alive(city) for city in range(dynamic.N)])
+    connections, distances = construct_fast_graph_connections(dynamic.coord_list[alive], dynamic.radius)
+    return alive[connections].reshape(-1, 2), distances
+
+
+def test_dynamic_graph():
+    coord_list = read_coordinate_file('Data/HungaryCities.txt')
+    dynamic = DynamicGraph(coord_list, 0.005)
+    rng = np.random.default_rng(0)
+    for step in range(300):
+        cities = [city for city in range(dynamic.N) if dynamic.is_alive(city)]
+        near = coord_list[rng.integers(len(coord_list))] + rng.normal(0, 0.003, 2)
+        if step % 3 == 0:
+            assert dynamic.add_city(near) == dynamic.N - 1
+        elif step % 3 == 1:
+            dynamic.remove_city(int(rng.choice(cities)))
+        else:
+            dynamic.move_city(int(rng.choice(cities)), near)
+
+        if step % 50 == 0 or step == 299:
+            connections, distances = rebuilt_connections(dynamic)
+            dynamic_connections, dynamic_distances = dynamic.graph_connections()
+            assert np.array_equal(dynamic_connections, connections)
+            assert np.array_equal(dynamic_distances, distances)
+
+    assert len(dynamic) == len(coord_list)
+    graph = dynamic.graph()
+    assert (graph != construct_graph(connections, distances, dynamic.N)).nnz == 0
+    assert (dynamic.undirected_graph() != make_undirected(graph)).nnz == 0
+    assert dynamic.undirected_graph() is dynamic.undirected_graph()
+
+    city = next(city for city in range(dynamic.N) if dynamic.is_alive(city))
+    assert dynamic.neighbours(city) == {int(j): d for j, d in zip(*find_neighbours(graph, city))}
+    dynamic.remove_city(city)
+    with pytest.raises(KeyError):
+        dynamic.move_city(city, [0., 0.])
+
+
+def test_dynamic_graph_radius_zero():
+    # Only cities at the same coordinates are connected, like construct_fast_graph_connections with radius 0
+    dynamic = DynamicGraph(np.array([[0., 0.], [0., 0.], [1., 1.]]), 0)
+    assert dynamic.neighbours(0) == {1: 0.}
+    dynamic.move_city(2, [0., 0.])
+    city = dynamic.add_city([1., 1.])
+    assert dynamic.neighbours(city) == {}
+    connections, distances = dynamic.graph_connections()
+    assert connections.tolist() == [[0, 1], [0, 2], [1, 2]] and distances.tolist() == [0., 0., 0.]
+
+
+def find_neighbours(graph, city):
+    undirected = make_undirected(graph)
+    lo, hi = undirected.indptr[city], undirected.indptr[city + 1]
+    return undirected.indices[lo:hi], undirected.data[lo:hi]
@@ -0,0 +1,60 @@
+import os
+import numpy as np
+from shortest_path import *
+from components import ComponentIndex
+from graph_cache import GraphCache
+
+SAMPLE = 'Data/SampleCoordinates.txt'
+
+
+def test_graph_cache(tmp_path):
+    coord_list = read_coordinate_file(SAMPLE)
+    connections, distances = construct_fast_graph_connections(coord_list, 0.08)
+    graph = construct_graph(connections, distances, len(coord_list))
+
+    cache = GraphCache(tmp_path / 'cache')
+    assert cache.load(SAMPLE, 0.08) is None
+    cache.store(SAMPLE, 0.08, graph)
+    cached = cache.load(SAMPLE, 0.08)
+    assert not cached.data.flags.writeable  # memory-mapped
+    assert (cached != graph).nnz == 0
+    assert np.array_equal(graph_connections(cached), connections)
+    assert cache.load(SAMPLE, 0.09) is None
+    assert np.array_equal(cache.load_components(SAMPLE, 0.08).labels, ComponentIndex.from_graph(graph).labels)
+
+
+def test_graph_cache_eviction(tmp_path):
+    coord_list = read_coordinate_file(SAMPLE)
+    cache = GraphCache(tmp_path)
+    for radius in (0.05, 0.08):
+        connections, distances = construct_fast_graph_connections(coord_list, radius)
+        cache.store(SAMPLE, radius, construct_graph(connections, distances, len(coord_list)))
+    os.utime(cache.path(SAMPLE, 0.05), ns=(0, 0))
+    os.utime(cache.path(SAMPLE, 0.08), ns=(1, 1))
+
+    # Loading a graph makes it the most recently used one, so only the other graph is removed
+    assert cache.load(SAMPLE, 0.05) is not None
+    cache.max_bytes = os.path.getsize(cache.path(SAMPLE, 0.05))
+    cache.evict()
+    assert os.listdir(tmp_path) == [os.path.basename(cache.path(SAMPLE, 0.05))]
+
+
+def test_graph_cache_read_only(tmp_path, monkeypatch):
+    coord_list = read_coordinate_file(SAMPLE)
+    connections, distances = construct_fast_graph_connections(coord_list, 0.08)
+    graph = construct_graph(connections, distances, len(coord_list))
+
+    # A cache directory that can not be created is a cache miss, not an error
+    (tmp_path / 'file').write_bytes(b'')
+    cache = GraphCache(tmp_path / 'file' / 'cache')
+    cache.store(SAMPLE, 0.08, graph)
+    assert cache.load(SAMPLE, 0.08) is None
+
+    # A graph in a cache that can not be written is still loaded
+    cache = GraphCache(tmp_path / 'cache')
+    cache.store(SAMPLE, 0.08, graph)
+
+    def read_only(*args, **kwargs):
+        raise PermissionError('read-only file system')
+    monkeypatch.setattr(os, 'utime', read_only)
+    assert (cache.load(SAMPLE, 0.08) != graph).nnz == 0
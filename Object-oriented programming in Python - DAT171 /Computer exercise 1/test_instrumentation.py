@@ -0,0 +1,48 @@
+import json
+from shortest_path import *
+from instrumentation import instrument, recording
+
+
+def test_recording():
+    with recording(memory=True, profile=True) as recorder:
+        coord_list = read_coordinate_file('Data/HungaryCities.txt')
+        connections, distances = construct_fast_graph_connections(coord_list, 0.005)
+        graph = construct_graph(indices=connections, distance=distances, N=len(coord_list))
+        shortest, dist_matrix = find_shortest_path(graph, 0, 5)
+
+    stages = [record['stage'] for record in recorder.records]
+    assert stages == ['read_coordinate_file', 'construct_fast_graph_connections', 'construct_graph',
+                      'find_shortest_path']
+    summary = recorder.summary()
+    assert summary['construct_graph'] == dict(summary['construct_graph'], nodes=850, edges=len(connections), calls=1)
+    assert summary['find_shortest_path']['settled'] == np.count_nonzero(np.isfinite(dist_matrix))
+    assert all(record['seconds'] >= 0 and record['peak_bytes'] > 0 for record in recorder.records)
+    assert json.loads(recorder.to_json())['summary']['read_coordinate_file']['nodes'] == 850
+    text = recorder.to_prometheus()
+    assert '# TYPE shortest_path_stage_seconds_total counter' in text
+    assert 'shortest_path_stage_edges{stage="construct_graph"} %d' % len(connections) in text
+    assert 'construct_fast_graph_connections' in recorder.profile_report('construct_fast_graph_connections')
+
+    # Nothing is recorded outside a recording
+    find_shortest_path(graph, 0, 5)
+    assert len(recorder.records) == 4
+
+
+def test_nested_stages():
+    @instrument('inner')
+    def inner():
+        return bytearray(1 << 20)
+
+    @instrument('outer', lambda args, kwargs, result: {'nodes': len(result)})
+    def outer():
+        block = bytearray(1 << 22)
+        del block
+        return [len(inner()) for _ in range(2)]
+
+    with recording(memory=True, profile=True) as recorder:
+        outer()
+    records = {record['stage']: record for record in recorder.records}
+    assert [record['stage'] for record in recorder.records] == ['inner', 'inner', 'outer']
+    assert records['inner']['depth'] == 1 and records['outer']['depth'] == 0
+    assert records['inner']['peak_bytes'] >= 1 << 20 and records['outer']['peak_bytes'] >= 1 << 22
+    assert recorder.summary()['outer']['nodes'] == 2 and list(recorder.profiles) == ['outer']
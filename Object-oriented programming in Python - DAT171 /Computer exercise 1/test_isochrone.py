@@ -0,0 +1,31 @@
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+from shortest_path import *
+from isochrone import combined_isochrone, isochrone, isochrones
+
+
+def test_isochrones():
+    coord_list = read_coordinate_file('Data/HungaryCities.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.005)
+    graph = construct_graph(connections, distances, len(coord_list))
+    sources = [0, 3, 17, 3, 640]
+    dist_matrix = dijkstra(graph, directed=False, indices=sources)
+
+    for budget in [0., 0.01, 0.05]:
+        result = isochrones(graph, sources, budget, chunk_size=2)
+        assert result.cities.dtype == np.int32 and result.distances.dtype == np.float32
+        for k, source in enumerate(sources):
+            cities = result.cities[result.indptr[k]:result.indptr[k + 1]]
+            assert np.array_equal(cities, np.flatnonzero(dist_matrix[k] <= budget))
+            assert np.allclose(result.distances[result.indptr[k]:result.indptr[k + 1]], dist_matrix[k, cities])
+
+    # A city at exactly the budget is inside, the same as with a symmetric graph searched with directed=True
+    budget = dist_matrix[0][dist_matrix[0] > 0].min()
+    cities, distances = isochrone(make_undirected(graph), 0, budget, directed=True)
+    assert np.array_equal(cities, np.flatnonzero(dist_matrix[0] <= budget)) and len(cities) > 1
+
+    cities, distances, nearest = combined_isochrone(graph, sources, 0.02)
+    assert np.array_equal(cities, np.flatnonzero(dist_matrix.min(axis=0) <= 0.02))
+    assert np.allclose(distances, dist_matrix[:, cities].min(axis=0))
+    rows = [sources.index(source) for source in nearest]
+    assert np.all(dist_matrix[rows, cities] == dist_matrix[:, cities].min(axis=0))
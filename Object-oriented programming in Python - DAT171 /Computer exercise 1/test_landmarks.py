@@ -0,0 +1,26 @@
+import math
+import numpy as np
+import pytest
+from shortest_path import *
+from landmarks import LandmarkIndex
+
+
+def test_landmark_index(tmp_path):
+    coord_list = read_coordinate_file('Data/HungaryCities.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.005)
+    graph = construct_graph(connections, distances, len(coord_list))
+
+    index = LandmarkIndex.from_graph(graph, k=8)
+    assert index.table.dtype == np.float32 and index.table.shape == (len(coord_list), 8)
+    index.save(tmp_path / 'landmarks.npz')
+    index = LandmarkIndex.load(tmp_path / 'landmarks.npz', graph)
+
+    rng = np.random.default_rng(0)
+    for start_node, end_node in rng.integers(0, len(coord_list), (50, 2)).tolist():
+        shortest, dist_matrix = find_shortest_path(graph, start_node, end_node)
+        path, distance = index.find_shortest_path(start_node, end_node)
+        if math.isinf(dist_matrix[end_node]):
+            assert (path, distance) == ([], math.inf)
+        else:
+            assert distance == pytest.approx(dist_matrix[end_node])
+            assert index.lower_bound(start_node, end_node) <= distance
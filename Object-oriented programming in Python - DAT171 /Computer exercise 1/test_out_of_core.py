@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from shortest_path import *
+import out_of_core
+from out_of_core import build_disk_graph, read_edge_files
+
+
+def test_disk_graph(tmp_path):
+    coord_list = read_coordinate_file('Data/HungaryCities.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.005)
+    graph = make_undirected(construct_graph(connections, distances, len(coord_list)))
+
+    disk_graph = build_disk_graph(coord_list, 0.005, tmp_path, chunk_size=100, keep_edges=True)
+    rows, cols, lengths = read_edge_files(tmp_path)
+    assert rows.dtype == cols.dtype == np.int32 and lengths.dtype == np.float32
+    assert len(rows) == len(connections)
+    assert not disk_graph.data.flags.owndata and not disk_graph.indices.flags.owndata  # memory-mapped, not copied
+    assert disk_graph.indices.dtype == np.int32
+
+    sorted_graph = disk_graph.copy()
+    sorted_graph.sort_indices()
+    assert np.array_equal(sorted_graph.indptr, graph.indptr)
+    assert np.array_equal(sorted_graph.indices, graph.indices)
+    assert np.allclose(sorted_graph.data, graph.data, rtol=1e-6)
+
+    path, dist_matrix = find_shortest_path(disk_graph, 0, 5, directed=True)
+    expected_path, expected_dist = find_shortest_path(graph, 0, 5, directed=True)
+    assert dist_matrix[5] == pytest.approx(expected_dist[5], rel=1e-6)
+    assert path[0] == 0 and path[-1] == 5
+
+
+def test_disk_graph_too_large(tmp_path, monkeypatch):
+    # A graph beyond the int32 indices of csgraph is refused before anything is written, not copied into memory
+    coord_list = read_coordinate_file('Data/SampleCoordinates.txt')
+    count = len(construct_fast_graph_connections(coord_list, 0.08)[0])
+    monkeypatch.setattr(out_of_core, 'MAX_STORED_CONNECTIONS', 2 * count - 1)
+    with pytest.raises(ValueError, match='int32'):
+        build_disk_graph(coord_list, 0.08, tmp_path)
+    assert not (tmp_path / 'indices.npy').exists()
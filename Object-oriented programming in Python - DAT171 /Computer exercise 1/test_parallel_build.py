@@ -0,0 +1,12 @@
+import numpy as np
+from shortest_path import *
+from parallel_build import construct_parallel_graph_connections
+
+
+def test_parallel_graph_connections():
+    coord_list = read_coordinate_file('Data/HungaryCities.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.005)
+    for processes, tiles in [(0, 1), (0, 7), (0, 1000), (2, None)]:
+        tiled_connections, tiled_distances = construct_parallel_graph_connections(coord_list, 0.005, processes, tiles)
+        assert np.array_equal(tiled_connections, connections)
+        assert np.array_equal(tiled_distances, distances)
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from shortest_path import *
+from routing_client import RoutingClient, load_test
+from routing_daemon import RoutingService, serve_unix
+
+
+def hungary_service():
+    coord_list = read_coordinate_file('Data/HungaryCities.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.005)
+    return RoutingService(make_undirected(construct_graph(connections, distances, len(coord_list))))
+
+
+def test_routing_service():
+    service = hungary_service()
+    shortest, dist_matrix = find_shortest_path(service.graph, 0, 5, directed=True)
+
+    answer = json.loads(service.handle(b'{"from": 0, "to": 5, "id": "a"}'))
+    assert answer['path'] == [int(city) for city in shortest] and answer['id'] == 'a'
+    assert abs(answer['distance'] - dist_matrix[5]) < 1e-6 and answer['latency_ms'] >= 0
+
+    for line in [b'[0, 5]', b'{"from": 0}', b'{"from": 0, "to": 850}', b'{"from": true, "to": 5}', b'{']:
+        assert 'error' in json.loads(service.handle(line))
+    stats = json.loads(service.handle('{"stats": true}'))
+    assert stats['queries'] == 6 and stats['errors'] == 5
+
+
+def route(path):
+    with RoutingClient(path) as client:
+        return client.route(0, 5)
+
+
+def test_routing_daemon_socket(tmp_path):
+    service = hungary_service()
+    path = str(tmp_path / 'route.sock')
+
+    async def run():
+        server = asyncio.ensure_future(serve_unix(service, path))
+        while not os.path.exists(path):
+            await asyncio.sleep(0.01)
+        result = await load_test(path, 850, clients=4, queries=25, sources=5)
+        answer = await asyncio.to_thread(route, path)
+        server.cancel()
+        return result, answer
+
+    result, answer = asyncio.run(run())
+    assert result['queries'] == 100 and result['client_ms']['max'] >= result['client_ms']['p50']
+    assert answer['path'][0] == 0 and answer['path'][-1] == 5
+    assert service.tree_cache.hits > 0 and not os.path.exists(path)
+
+
+def test_routing_daemon_stdio(tmp_path):
+    # The coordinate sidecar is written next to the file, so the file is copied out of Data first
+    filename = tmp_path / 'HungaryCities.txt'
+    filename.write_bytes(open('Data/HungaryCities.txt', 'rb').read())
+    queries = tmp_path / 'queries.jsonl'
+    queries.write_text('{"from": 0, "to": 5, "id": 1}\n\n{"from": 0, "to": 850, "id": 2}\n')
+    command = [sys.executable, 'routing_daemon.py', str(filename), '--radius', '0.005',
+               '--cache', str(tmp_path / 'cache')]
+
+    # Standard input is a regular file, which the pipe transport does not accept, and then a pipe
+    with open(queries, 'rb') as file:
+        from_file = subprocess.run(command, stdin=file, capture_output=True, check=True).stdout
+    from_pipe = subprocess.run(command, input=queries.read_bytes(), capture_output=True, check=True).stdout
+    for output in (from_file, from_pipe):
+        answers = [json.loads(line) for line in output.splitlines()]
+        assert [answer['id'] for answer in answers] == [1, 2]
+        assert answers[0]['path'][0] == 0 and answers[0]['path'][-1] == 5 and 'error' in answers[1]
@@ -0,0 +1,46 @@
+import pickle
+import numpy as np
+import pytest
+from shortest_path import *
+from batch_routing import find_shortest_paths
+from shared_graph import SharedGraph
+
+
+def test_shared_graph():
+    coord_list = read_coordinate_file('Data/HungaryCities.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.005)
+    graph = make_undirected(construct_graph(connections, distances, len(coord_list)))
+
+    with SharedGraph.publish(graph) as shared:
+        assert shared.owner and shared.nbytes() == graph.data.nbytes + graph.indices.nbytes + graph.indptr.nbytes
+        handle = pickle.loads(pickle.dumps(shared.handle))  # the handle is what a worker process gets
+        worker = SharedGraph.attach(handle)
+        attached = worker.graph()
+        assert not worker.owner and attached.shape == graph.shape and (attached != graph).nnz == 0
+        for array in (attached.data, attached.indices, attached.indptr):
+            assert not array.flags.writeable and not array.flags.owndata
+        with pytest.raises(ValueError):
+            attached.data[0] = 1.
+        assert find_shortest_path(attached, 0, 5, directed=True)[1][5] == find_shortest_path(graph, 0, 5)[1][5]
+
+        del attached
+        worker.close()
+        worker.close()
+        with pytest.raises(ValueError):
+            worker.graph()
+
+    with pytest.raises(FileNotFoundError):
+        SharedGraph.attach(handle)
+
+
+@pytest.mark.parametrize('processes', [0, 2])
+def test_find_shortest_paths_shared(processes):
+    coord_list = read_coordinate_file('Data/HungaryCities.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.005)
+    graph = make_undirected(construct_graph(connections, distances, len(coord_list)))
+
+    rng = np.random.default_rng(0)
+    queries = [(int(start_node), int(end_node)) for start_node, end_node in rng.integers(0, len(coord_list), (30, 2))]
+    expected = list(find_shortest_paths(graph, queries, directed=True, processes=0))
+    with SharedGraph.publish(graph) as shared:
+        assert list(find_shortest_paths(shared, queries, directed=True, processes=processes, group_size=4)) == expected
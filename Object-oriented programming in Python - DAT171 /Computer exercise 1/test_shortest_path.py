@@ -0,0 +1,237 @@
+import json
+import math
+import os
+import numpy as np
+import pytest
+from scipy.sparse.csgraph import connected_components
+from shortest_path import *
+
+SAMPLE = 'Data/SampleCoordinates.txt'
+
+
+def test_read_coordinate_file():
+    coord_list = read_coordinate_file(SAMPLE)
+    assert coord_list.shape == (7, 2)
+    assert coord_list.dtype == np.float64
+    # {0., -1.} is the first city in the file
+    assert coord_list[0, 0] == np.pi * -1 / 180
+    assert coord_list[0, 1] == pytest.approx(0)
+
+    # The parsed blocks should not depend on the chunk size
+    assert np.array_equal(read_coordinate_file(SAMPLE, chunk_size=5), coord_list)
+
+
+def test_read_coordinate_file_raw(tmp_path):
+    lat_lon = read_coordinate_file(SAMPLE, project=False)
+    assert lat_lon[1].tolist() == [6., -2.]
+
+    # Windows line endings and missing spaces are accepted as well
+    filename = tmp_path / 'cities.txt'
+    filename.write_bytes(b'{6., -2.}\r\n{3.,-3.}\r\n')
+    assert read_coordinate_file(filename, project=False).tolist() == [[6., -2.], [3., -3.]]
+
+    # A line with the wrong number of coordinates must not be paired with the next line
+    filename.write_bytes(b'{1., 2., 3.}\n{4.}\n{5., 6.}')
+    for chunk_size in (5, 1 << 24):
+        with pytest.raises(ValueError):
+            read_coordinate_file(filename, project=False, chunk_size=chunk_size)
+
+
+def test_read_coordinate_file_cache(tmp_path):
+    filename = tmp_path / 'cities.txt'
+    filename.write_bytes(open(SAMPLE, 'rb').read())
+    data_path, key_path = coordinate_cache_paths(filename)
+
+    coord_list = read_coordinate_file(filename, cache=True)
+    assert os.path.exists(data_path) and os.path.exists(key_path)
+
+    cached = read_coordinate_file(filename, cache=True)
+    assert isinstance(cached, np.memmap)
+    assert np.array_equal(cached, coord_list)
+
+    # A changed file must not be answered from the old sidecar
+    filename.write_bytes(b'{1., 2.}\n')
+    assert read_coordinate_file(filename, cache=True).shape == (1, 2)
+
+
+def test_fast_graph_connections():
+    coord_list = read_coordinate_file('Data/HungaryCities.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.005)
+    slow_connections, slow_distances = construction_graph_connections(coord_list, 0.005)
+    assert np.array_equal(connections, slow_connections)
+    assert np.array_equal(distances, slow_distances)
+    assert np.all(connections[:, 0] < connections[:, 1])  # no city is connected to itself
+
+    connections, distances = construct_fast_graph_connections(coord_list, 0.)
+    assert connections.shape == (0, 2) and distances.shape == (0,)
+
+
+def test_grid_graph_connections():
+    coord_list = read_coordinate_file('Data/HungaryCities.txt')
+    for radius in [0., 0.001, 0.005, 0.05]:
+        connections, distances = construct_fast_graph_connections(coord_list, radius)
+        grid_connections, grid_distances = construct_fast_graph_connections(coord_list, radius, method='grid')
+        assert np.array_equal(grid_connections, connections)
+        assert np.array_equal(grid_distances, distances)
+
+    coord_list = np.array([[0., 0.], [0., 0.], [0.3, 0.4], [2., 0.]])  # the same city twice and one at the radius
+    connections, distances = construct_fast_graph_connections(coord_list, 0.5, method='grid')
+    assert connections.tolist() == [[0, 1], [0, 2], [1, 2]]
+    with pytest.raises(ValueError):
+        construct_fast_graph_connections(coord_list, 0.5, method='quadtree')
+
+
+def test_knn_graph_connections():
+    coord_list = read_coordinate_file('Data/HungaryCities.txt')
+    connections, distances = construct_knn_graph_connections(coord_list, 4)
+    assert len(connections) <= 4 * len(coord_list)
+    assert np.all(connections[:, 0] < connections[:, 1])
+    assert len(np.unique(connections, axis=0)) == len(connections)
+    assert np.bincount(connections.ravel(), minlength=len(coord_list)).min() >= 4
+
+    graph = construct_graph(connections, distances, len(coord_list))
+    shortest, dist_matrix = find_shortest_path(graph, 0, 5)
+    assert shortest[0] == 0 and shortest[-1] == 5
+
+    # With k larger than any neighbourhood the radius alone decides, like construct_fast_graph_connections
+    radius_connections, radius_distances = construct_fast_graph_connections(coord_list, 0.005)
+    connections, distances = construct_knn_graph_connections(coord_list, len(coord_list), max_radius=0.005)
+    assert np.array_equal(connections, radius_connections)
+    assert np.array_equal(distances, radius_distances)
+
+
+def test_find_astar_path():
+    coord_list = read_coordinate_file('Data/GermanyCities.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.0025)
+    graph = construct_graph(connections, distances, len(coord_list))
+    undirected = make_undirected(graph)
+
+    # The graph from construct_graph stores every connection once, both directions must be searched
+    for start_node, end_node in [(1573, 10584), (10584, 1573)]:
+        shortest, dist_matrix = find_shortest_path(graph, start_node, end_node)
+        path, distance, settled = find_astar_path(graph, coord_list, start_node, end_node, return_settled=True)
+        assert path == shortest
+        assert distance == pytest.approx(dist_matrix[end_node])
+        assert settled < len(coord_list)
+        assert find_astar_path(undirected, coord_list, start_node, end_node, directed=True) == (path, distance)
+
+    assert find_astar_path(graph, coord_list, 5, 5) == ([5], 0.)
+    assert find_astar_path(graph, coord_list, 0, 1) == ([], math.inf)  # Berlin and Hamburg are not connected
+
+
+def test_find_astar_path_settled():
+    # The straight line to the last city keeps A* to far fewer cities than the same search without it, benchmark.py
+    # has the timings
+    coord_list = read_coordinate_file('Data/GermanyCities.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.01)
+    undirected = make_undirected(construct_graph(connections, distances, len(coord_list)))
+    astar = dijkstra = 0
+    for start_node, end_node in np.random.default_rng(0).integers(0, len(coord_list), (20, 2)).tolist():
+        astar += find_astar_path(undirected, coord_list, start_node, end_node, directed=True, return_settled=True)[2]
+        dijkstra += astar_search(undirected, start_node, end_node, lambda node: 0., return_settled=True)[2]
+    assert astar < dijkstra / 2
+
+
+def test_radius_sweep():
+    coord_list = read_coordinate_file('Data/HungaryCities.txt')
+    results = list(radius_sweep(coord_list, [0.01, 0.003, 0.005], 0, 1))
+    assert [result.radius for result in results] == [0.003, 0.005, 0.01]
+
+    for result in results:
+        connections, distances = construct_fast_graph_connections(coord_list, result.radius)
+        graph = make_undirected(construct_graph(connections, distances, len(coord_list)))
+        assert (result.graph != graph).nnz == 0
+        assert result.components == connected_components(graph, directed=False)[0]
+        dist_matrix = find_shortest_path(graph, 0, 1)[1]
+        assert result.distance == dist_matrix[1]
+        assert result.path == ([] if math.isinf(dist_matrix[1]) else find_shortest_path(graph, 0, 1)[0])
+
+
+def test_compact_mode():
+    coord_list = read_coordinate_file('Data/HungaryCities.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.005)
+    graph = make_undirected(construct_graph(connections, distances, len(coord_list)))
+
+    compact_coords = read_coordinate_file('Data/HungaryCities.txt', compact=True)
+    compact_connections, compact_distances = construct_fast_graph_connections(compact_coords, 0.005, compact=True)
+    compact_graph = make_undirected(construct_graph(compact_connections, compact_distances, len(coord_list)))
+    assert compact_coords.dtype == compact_distances.dtype == compact_graph.dtype == np.float32
+    assert compact_connections.dtype == compact_graph.indices.dtype == np.int32
+    assert np.array_equal(compact_connections, connections)
+
+    report = memory_report(coord_list, connections, distances, graph)
+    compact_report = memory_report(compact_coords, compact_connections, compact_distances, compact_graph)
+    assert compact_report['total'] < 0.7 * report['total']
+    assert report['float64_total'] == compact_report['float64_total'] == report['total']
+    assert report['saving'] == report['routing_copy'] == 0
+    assert compact_report['saving'] == report['total'] - compact_report['total']
+    assert compact_report['routing_copy'] == report['graph']  # csgraph searches a float64 copy of the compact graph
+
+    tolerance = COMPACT_TOLERANCE * np.abs(coord_list).max()
+    for start_node, end_node in [(0, 5), (3, 200), (17, 640)]:
+        path, dist_matrix = find_shortest_path(compact_graph, start_node, end_node, directed=True)
+        expected = find_shortest_path(graph, start_node, end_node, directed=True)[1][end_node]
+        assert abs(dist_matrix[end_node] - expected) <= max(len(path) - 1, 0) * tolerance
+
+    slow_connections, slow_distances = construction_graph_connections(compact_coords[:200], 0.005, compact=True)
+    assert slow_connections.dtype == np.int32 and slow_distances.dtype == np.float32
+
+
+def test_render_points(tmp_path):
+    coord_list = read_coordinate_file('Data/HungaryCities.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.005)
+    path = find_shortest_path(construct_graph(connections, distances, len(coord_list)), 0, 5)[0]
+
+    image, extent = density_image(coord_list, connections, (300, 400))
+    assert image.shape[0] <= 300 and image.shape[1] <= 400
+    assert image.sum() >= len(coord_list) + len(connections)
+    assert extent[0] <= coord_list[:, 0].min() and extent[1] >= coord_list[:, 0].max()
+    assert extent[2] <= coord_list[:, 1].min() and extent[3] >= coord_list[:, 1].max()
+
+    for filename, threshold in [('lines.png', 100000), ('density.png', 0), ('density.svg', 0)]:
+        plot_points(coord_list, connections, path, filename=str(tmp_path / filename), density_threshold=threshold,
+                    size=(4, 4), dpi=50)
+        assert (tmp_path / filename).stat().st_size > 0
+    with open(tmp_path / 'density.png', 'rb') as file:
+        assert file.read(8) == b'\x89PNG\r\n\x1a\n'
+
+
+def test_main(tmp_path, capsys):
+    # The coordinate sidecar is written next to the file, so the file is copied out of Data first
+    filename = tmp_path / 'HungaryCities.txt'
+    filename.write_bytes(open('Data/HungaryCities.txt', 'rb').read())
+    arguments = [str(filename), '0', '5', '--radius', '0.005', '--format', 'json', '--cache', str(tmp_path / 'cache')]
+    coord_list = read_coordinate_file(filename)
+    connections, distances = construct_fast_graph_connections(coord_list, 0.005)
+    path, dist_matrix = find_shortest_path(construct_graph(connections, distances, len(coord_list)), 0, 5)
+
+    for cached in (False, True):
+        assert main(arguments) == 0
+        answer = json.loads(capsys.readouterr().out)
+        assert answer['cached'] == cached
+        assert answer['path'] == path and answer['distance'] == dist_matrix[5]
+    assert 'construct_fast_graph_connections' not in answer['seconds']
+
+    # A compact graph is never taken from or put into the cache of float64 graphs
+    assert main(arguments + ['--compact']) == 0
+    answer = json.loads(capsys.readouterr().out)
+    assert not answer['cached'] and 'construct_fast_graph_connections' in answer['seconds']
+    assert answer['path'] == path and answer['distance'] == pytest.approx(dist_matrix[5], rel=1e-6)
+
+    assert main(arguments[:3] + ['--builder', 'grid', '--no-cache', '--plot', str(tmp_path / 'route.png')]) == 0
+    assert (tmp_path / 'route.png').stat().st_size > 0
+    with pytest.raises(SystemExit):
+        main([str(filename), '0', '850', '--no-cache'])
+
+
+def test_lazy_imports():
+    import subprocess
+    import sys
+    loaded = subprocess.run([sys.executable, '-c', 'import sys, shortest_path; print(sorted(sys.modules))'],
+                            capture_output=True, text=True, check=True).stdout
+    assert 'matplotlib' not in loaded and 'scipy' not in loaded
+
+    wall, imports, slowest = import_report([SAMPLE, '0', '5', '--radius', '0.08', '--no-cache'])
+    assert 0 < imports < wall
+    assert any(module.startswith('scipy.') for _, _, module in slowest)
+    assert all(not module.startswith('matplotlib') for _, _, module in slowest)
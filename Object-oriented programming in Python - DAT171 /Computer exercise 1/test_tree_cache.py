@@ -0,0 +1,32 @@
+import gc
+import math
+import numpy as np
+import pytest
+from shortest_path import *
+from tree_cache import ShortestPathTreeCache
+
+
+def test_shortest_path_tree_cache():
+    coord_list = read_coordinate_file('Data/HungaryCities.txt')
+    connections, distances = construct_fast_graph_connections(coord_list, 0.005)
+    graph = construct_graph(connections, distances, len(coord_list))
+    tree_bytes = len(coord_list) * 8
+
+    cache = ShortestPathTreeCache(max_bytes=2 * tree_bytes)
+    for start_node, end_node in [(0, 5), (0, 9), (1, 3), (0, 2), (4, 5), (1, 7)]:
+        shortest, dist_matrix = find_shortest_path(graph, start_node, end_node)
+        path, distance = cache.find_shortest_path(graph, start_node, end_node)
+        assert path == [int(city) for city in shortest]
+        if math.isinf(dist_matrix[end_node]):
+            assert distance == math.inf
+        else:
+            assert distance == pytest.approx(dist_matrix[end_node], rel=1e-6)
+
+    # 0 hits twice, 4 pushes 1 out and 1 is searched again
+    assert cache.stats() == {'hits': 2, 'misses': 4, 'evictions': 2, 'trees': 2, 'bytes': 2 * tree_bytes}
+    distances, predecessors = cache.tree(graph, 1)
+    assert distances.dtype == np.float32 and predecessors.dtype == np.int32
+
+    del graph
+    gc.collect()
+    assert len(cache) == 0 and cache.bytes == 0
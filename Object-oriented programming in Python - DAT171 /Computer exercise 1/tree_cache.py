@@ -0,0 +1,108 @@
+# Computer exercise 1 - in-memory cache of shortest path trees for start cities that are asked for again
+
+import collections
+import math
+import weakref
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+
+class ShortestPathTreeCache:
+    """ A memory-bounded LRU cache of single-source shortest path trees, keyed by the graph and the start city """
+
+    def __init__(self, max_bytes=256 << 20):
+        """
+        :param max_bytes: the memory budget of the cached trees, the least recently used trees are removed first
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._trees = collections.OrderedDict()
+        self._graphs = {}
+
+    def __len__(self):
+        return len(self._trees)
+
+    def tree(self, graph, start_node, directed=False):
+        """
+        :param graph: The csr matrix from construct_graph
+        :param start_node: The first city
+        :param directed: if False the connections in graph can be used in both directions, like in find_shortest_path
+        :return: the float32 distances and the int32 predecessors of the shortest path tree from start_node
+        """
+        key = (self._graph_key(graph), int(start_node), directed)
+        tree = self._trees.get(key)
+        if tree is not None:
+            self.hits += 1
+            self._trees.move_to_end(key)
+            return tree
+
+        self.misses += 1
+        dist_matrix, predecessors = dijkstra(graph, directed=directed, indices=start_node, return_predecessors=True)
+        tree = dist_matrix.astype(np.float32), predecessors.astype(np.int32)
+        self._trees[key] = tree
+        self.bytes += tree[0].nbytes + tree[1].nbytes
+        self._evict()
+        return tree
+
+    def find_shortest_path(self, graph, start_node, end_node, directed=False):
+        """
+        :param graph: The csr matrix from construct_graph
+        :param start_node: The first city
+        :param end_node: The last city
+        :param directed: if False the connections in graph can be used in both directions, like in find_shortest_path
+        :return: the shortest path as a list of cities and its total distance in float32 precision, an empty path and
+                 inf if end_node can not be reached
+        """
+        dist_matrix, predecessors = self.tree(graph, start_node, directed)
+        if np.isinf(dist_matrix[end_node]):
+            return [], math.inf
+        shortest = [int(end_node)]
+        while predecessors.item(shortest[-1]) != -9999:
+            shortest.append(predecessors.item(shortest[-1]))
+        return shortest[-1::-1], float(dist_matrix[end_node])
+
+    def stats(self):
+        """
+        :return: a dictionary with the hit, miss and eviction counters and the size of the cache
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'trees': len(self._trees),
+                'bytes': self.bytes}
+
+    def clear(self):
+        """
+        Removes every cached tree, the counters are kept.
+        """
+        self._trees.clear()
+        self.bytes = 0
+
+    def _graph_key(self, graph):
+        """
+        :param graph: a csr matrix
+        :return: a key that identifies the graph as long as it exists
+        """
+        # The id of a matrix can be used again after the matrix is gone, so its trees are dropped together with it
+        key = id(graph)
+        if key not in self._graphs:
+            self._graphs[key] = weakref.finalize(graph, self._forget_graph, key)
+        return key
+
+    def _forget_graph(self, key):
+        """
+        :param key: the key of a graph that no longer exists
+        """
+        self._graphs.pop(key, None)
+        for tree_key in [tree_key for tree_key in self._trees if tree_key[0] == key]:
+            distances, predecessors = self._trees.pop(tree_key)
+            self.bytes -= distances.nbytes + predecessors.nbytes
+
+    def _evict(self):
+        """
+        Removes the least recently used trees until the cache fits in max_bytes, the newest tree is always kept.
+        """
+        while self.bytes > self.max_bytes and len(self._trees) > 1:
+            distances, predecessors = self._trees.popitem(last=False)[1]
+            self.bytes -= distances.nbytes + predecessors.nbytes
+            self.evictions += 1